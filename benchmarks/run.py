@@ -0,0 +1,346 @@
+"""
+Benchmarks the rendering of synthetic e-mails
+
+  python benchmarks/run.py --output results.json
+  python benchmarks/run.py --compare results.json
+  python benchmarks/run.py --path path/to/other/checkout --output other.json
+
+The installed emailbuilder package is measured, unless `--path` gives
+a source tree to import it from. When a release lacks the newer APIs,
+the workloads build tables from components and send the mail merge as
+one message per recipient, so earlier releases can be compared too
+
+Each sample renders a freshly built e-mail, so the timings
+don't benefit from the components' render caches
+"""
+
+from argparse import ArgumentParser
+from typing import Any, Callable, Optional
+
+import importlib
+import json
+import os
+import platform
+import re
+import statistics
+import struct
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+
+eb = None
+experimental = None
+
+
+def load(path: Optional[str] = None) -> None:
+  """
+  Imports the emailbuilder package to measure
+
+  :param path: Source tree to import the package from, defaults to the
+               installed package, or this checkout if none is installed
+  """
+  global eb, experimental
+  if path is not None:
+    sys.path.insert(0, os.path.abspath(path))
+  try:
+    eb = importlib.import_module("emailbuilder")
+  except ImportError:
+    if path is not None:
+      raise
+    checkout = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"emailbuilder isn't installed, measuring {checkout}", file=sys.stderr)
+    sys.path.insert(0, checkout)
+    eb = importlib.import_module("emailbuilder")
+  experimental = importlib.import_module("emailbuilder.experimental")
+
+
+def png(seed: int, size: int = 16) -> bytes:
+  """
+  Creates a small PNG image
+
+  :param seed: Seed of the image's colour
+  :param size: Width and height of the image, in pixels
+
+  :return: The image as bytes
+  """
+  def chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+  pixel = bytes([seed % 256, (seed * 7) % 256, (seed * 13) % 256])
+  rows = b"".join([b"\x00" + pixel * size for _ in range(size)])
+  return (
+      b"\x89PNG\r\n\x1a\n"
+      + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+      + chunk(b"IDAT", zlib.compress(rows))
+      + chunk(b"IEND", b"")
+  )
+
+
+def new_email() -> Any:
+  return experimental.EMail("Benchmark", "sender@example.com", "receiver@example.com")
+
+
+def nested(depth: int = 12, width: int = 6) -> Any:
+  email = new_email()
+  parent = email
+  for level in range(depth):
+    container = eb.Container(style={"padding": f"{level}px", "color": "#333"})
+    items = eb.OrderedList()
+    for i in range(width):
+      items.append(f"Item {level}.{i}")
+    items.append(eb.Paragraph(f"Level **{level}**"))
+    container.append(eb.Header(f"Section {level}"))
+    container.append(items)
+    parent.append(container)
+    parent = container
+  return email
+
+
+def table(rows: list, header: list, column_styles: Optional[list] = None) -> Any:
+  """
+  Creates a table with `Table.from_rows`, or in releases without it,
+  with a component per row
+
+  :param rows: The table's rows
+  :param header: The column headers
+  :param column_styles: Custom style rules for each column's cells
+
+  :return: The table
+  """
+  if hasattr(eb.Table, "from_rows"):
+    return eb.Table.from_rows(rows, header=header, column_styles=column_styles)
+  _styles = [
+      f" style=\"{eb.parse_style(style)}\"" if style else ""
+      for style in column_styles or [None] * len(header)
+  ]
+  _table = eb.Table()
+  _table.append(eb.Custom("<tr>" + "".join([f"<th>{title}</th>" for title in header]) + "</tr>", " ".join(header)))
+  for row in rows:
+    _table.append(eb.Custom(
+        "<tr>" + "".join([f"<td{style}>{value}</td>" for style, value in zip(_styles, row)]) + "</tr>",
+        " ".join([str(value) for value in row])
+    ))
+  return _table
+
+
+def wide_table(rows: int = 5000, columns: int = 8) -> Any:
+  email = new_email()
+  email.append(table(
+      [[row * columns + column for column in range(columns)] for row in range(rows)],
+      [f"Column {column}" for column in range(columns)],
+      [{"text-align": "right"}] * columns
+  ))
+  return email
+
+
+def paragraphs(count: int = 2000) -> Any:
+  email = new_email()
+  for i in range(count):
+    email.append(eb.Paragraph(
+        f"Paragraph {i} with **bold**, *oblique*, _underlined_ and -struck- text",
+        style={"margin": "0"}
+    ))
+  return email
+
+
+def images(count: int = 48) -> Any:
+  email = new_email()
+  for i in range(count):
+    email.append(eb.ImageRaw(png(i), "png", alt=f"Image {i}"))
+  return email
+
+
+def report(name: str = "{name}") -> Any:
+  email = new_email()
+  email.append(eb.Header(f"Report for {name}"))
+  email.append(eb.Paragraph(f"Hi {name}, here is your **weekly** summary"))
+  email.append(table([[i, i * i] for i in range(50)], ["n", "n squared"]))
+  email.append(eb.ImageRaw(png(1), "png", alt="Logo"))
+  return email
+
+
+def mail_merge(contexts: list) -> Callable:
+  """
+  Gets the mail merge operation: `render_many` over the report's slots,
+  or in releases without it, a report built and sent per recipient
+
+  :param contexts: Slot values for each recipient
+
+  :return: The operation, taking the report with its `{name}` slots
+  """
+  if hasattr(eb.EMail, "render_many"):
+    return lambda email: list(email.render_many(contexts))
+  return lambda email: [report(context["name"]).message() for context in contexts]
+
+
+workloads = {
+    "nested": nested,
+    "wide_table": wide_table,
+    "paragraphs": paragraphs,
+    "images": images
+}
+
+operations = {
+    "html": lambda email: email.html(),
+    "plain": lambda email: email.plain(),
+    "message": lambda email: email.message(),
+    "mime": lambda email: email.mime()
+}
+
+
+def measure(build: Callable, run: Callable, repeat: int, units: int = 1) -> dict:
+  """
+  Measures an operation's latency, throughput and peak memory
+
+  :param build: Function creating the operation's input
+  :param run: The operation
+  :param repeat: Number of timed samples
+  :param units: Number of units, e.g. messages, processed by each run
+
+  :return: The measurements
+  """
+  samples = []
+  for _ in range(repeat):
+    subject = build()
+    start = time.perf_counter()
+    run(subject)
+    samples.append(time.perf_counter() - start)
+
+  subject = build()
+  tracemalloc.start()
+  run(subject)
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  median = statistics.median(samples)
+  return {
+      "samples": len(samples),
+      "min": min(samples),
+      "median": median,
+      "mean": statistics.mean(samples),
+      "throughput": units / median if median else None,
+      "peak_bytes": peak
+  }
+
+
+def run(repeat: int = 5, recipients: int = 1000, selected: Optional[list] = None) -> dict:
+  """
+  Runs the benchmarks
+
+  :param repeat: Number of timed samples of each benchmark
+  :param recipients: Number of recipients of the mail merge benchmark
+  :param selected: Names of the benchmarks to run, defaults to all of them
+
+  :return: The results, by benchmark name
+  """
+  results = {}
+  for workload, build in workloads.items():
+    for operation, function in operations.items():
+      name = f"{workload}.{operation}"
+      if selected and name not in selected and workload not in selected:
+        continue
+      print(f"{name} ...", file=sys.stderr)
+      results[name] = measure(build, function, repeat)
+
+  if not selected or "mail_merge" in selected:
+    print("mail_merge ...", file=sys.stderr)
+    contexts = [
+        {"name": f"Recipient {i}", "address": f"recipient{i}@example.com"}
+        for i in range(recipients)
+    ]
+    results["mail_merge"] = measure(report, mail_merge(contexts), repeat, units=recipients)
+  return results
+
+
+def version() -> dict:
+  """
+  Identifies the code measured: where the package was imported from,
+  and its version and git revision
+
+  :return: The package's "path", "version" and "revision"
+  """
+  path = os.path.dirname(os.path.abspath(eb.__file__))
+  _version = getattr(eb, "__version__", None)
+  if _version is None:
+    try:
+      from importlib.metadata import distribution, PackageNotFoundError
+      _distribution = distribution("emailbuilder")
+      if os.path.abspath(_distribution.locate_file("emailbuilder/__init__.py")) == os.path.abspath(eb.__file__):
+        _version = _distribution.version
+    except (ImportError, PackageNotFoundError):
+      pass
+  if _version is None:
+    try:
+      with open(os.path.join(os.path.dirname(path), "pyproject.toml")) as fp:
+        match = re.search(r"^version\s*=\s*[\"']([^\"']+)", fp.read(), re.MULTILINE)
+      _version = match.group(1) if match else None
+    except OSError:
+      pass
+  try:
+    revision = subprocess.run(
+        ["git", "describe", "--always", "--dirty", "--tags"],
+        cwd=path, capture_output=True, text=True, check=True
+    ).stdout.strip() or None
+  except (OSError, subprocess.CalledProcessError):
+    revision = None
+  return {"path": path, "version": _version, "revision": revision}
+
+
+def compare(results: dict, baseline: dict) -> str:
+  """
+  Compares results with a previous run's
+
+  :param results: The current results
+  :param baseline: The previous results
+
+  :return: A text table of the median latency and peak memory ratios
+  """
+  lines = [f"{'benchmark':<24} {'median':>12} {'baseline':>12} {'ratio':>8} {'memory':>8}"]
+  for name, result in results.items():
+    previous = baseline.get(name)
+    if previous is None:
+      lines.append(f"{name:<24} {result['median']:>12.6f} {'-':>12} {'-':>8} {'-':>8}")
+      continue
+    ratio = result["median"] / previous["median"] if previous["median"] else float("nan")
+    memory = result["peak_bytes"] / previous["peak_bytes"] if previous["peak_bytes"] else float("nan")
+    lines.append(
+        f"{name:<24} {result['median']:>12.6f} {previous['median']:>12.6f} {ratio:>8.2f} {memory:>8.2f}"
+    )
+  return "\n".join(lines)
+
+
+def main() -> None:
+  parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("benchmarks", nargs="*", help="benchmarks or workloads to run, defaults to all")
+  parser.add_argument("--repeat", type=int, default=5, help="timed samples of each benchmark")
+  parser.add_argument("--recipients", type=int, default=1000, help="recipients of the mail merge")
+  parser.add_argument("--output", help="file to write the JSON results to")
+  parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+  parser.add_argument("--path", help="source tree to import emailbuilder from, defaults to the installed package")
+  args = parser.parse_args()
+  load(args.path)
+
+  results = run(args.repeat, args.recipients, args.benchmarks)
+  document = {
+      "package": version(),
+      "python": platform.python_version(),
+      "platform": platform.platform(),
+      "timestamp": time.time(),
+      "results": results
+  }
+  if args.output:
+    with open(args.output, "w") as fp:
+      json.dump(document, fp, indent=2)
+  else:
+    print(json.dumps(document, indent=2))
+
+  if args.compare:
+    with open(args.compare) as fp:
+      baseline = json.load(fp)
+    print(compare(results, baseline["results"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+  main()
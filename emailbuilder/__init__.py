@@ -1,4 +1,13 @@
 from .utils import *
+from .assets import *
+from .fragments import *
+from .context import *
 from .email import *
+from .template import *
+from .batch import *
+from .delivery import *
+from .export import *
 from .components import *
+from .profiling import Profile
+from .serialisation import dumps, loads
 from . import experimental
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from typing import NamedTuple
+
+import mmap
+import os
+import threading
+
+
+class Asset(NamedTuple):
+  """
+  A cached image file
+
+  :param path: The file's real path
+  :param content: The file's contents
+  :param extension: The file's extension, without the leading dot
+  :param stamp: The file's modification time and size, when it was read
+  """
+  path: str
+  content: bytes
+  extension: str
+  stamp: tuple
+
+
+class AssetCache:
+  """
+  Process-wide cache of image files
+
+  Entries are keyed by the file's real path and revalidated against its
+  modification time and size, and the least recently used entries are
+  evicted once the cache holds more than `max_bytes`
+
+  :param max_bytes: The cache's byte budget
+  """
+
+  def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+    self.max_bytes = max_bytes
+    self.size = 0
+    self.hits = 0
+    self.misses = 0
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, src: str) -> Asset:
+    """
+    Gets an image file, reading it only if it isn't cached or has changed
+
+    :param src: Path to the image file
+
+    :return: The cached asset
+    """
+    path = os.path.realpath(src)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with self._lock:
+      asset = self._entries.get(path)
+      if asset is not None and asset.stamp == stamp:
+        self._entries.move_to_end(path)
+        self.hits += 1
+        return asset
+      self.misses += 1
+
+    with open(path, "rb") as img:
+      content = img.read()
+    asset = Asset(
+        path=path,
+        content=content,
+        extension=os.path.splitext(path)[1][1:].lower(),
+        stamp=stamp
+    )
+
+    with self._lock:
+      previous = self._entries.pop(path, None)
+      if previous is not None:
+        self.size -= len(previous.content)
+      if len(content) <= self.max_bytes:
+        self._entries[path] = asset
+        self.size += len(content)
+        self._evict()
+    return asset
+
+  def _evict(self) -> None:
+    while self.size > self.max_bytes and self._entries:
+      _, asset = self._entries.popitem(last=False)
+      self.size -= len(asset.content)
+
+  def resize(self, max_bytes: int) -> None:
+    """
+    Changes the cache's byte budget, evicting entries if needed
+
+    :param max_bytes: The new byte budget
+    """
+    with self._lock:
+      self.max_bytes = max_bytes
+      self._evict()
+
+  def clear(self) -> None:
+    """
+    Empties the cache
+    """
+    with self._lock:
+      self._entries.clear()
+      self.size = 0
+
+
+def map_file(path: str) -> bytes | memoryview:
+  """
+  Memory-maps a file, so that its contents are only paged in as they are read
+
+  :param path: Path to the file
+
+  :return: A read-only view of the file's contents
+  """
+  with open(path, "rb") as fp:
+    if os.fstat(fp.fileno()).st_size == 0:
+      return b""
+    return memoryview(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+asset_cache = AssetCache()
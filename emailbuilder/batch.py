@@ -0,0 +1,95 @@
+from .context import AttachmentRegistry
+from .email import EMail
+from .template import Template
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from email.message import EmailMessage
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+_worker_template = None
+_worker_as_bytes = False
+_worker_registry = None
+
+
+def _init_worker(template: Template, as_bytes: bool) -> None:
+  global _worker_template, _worker_as_bytes, _worker_registry
+  _worker_template = template
+  _worker_as_bytes = as_bytes
+  _worker_registry = AttachmentRegistry()
+
+
+def _render_chunk(contexts: list) -> list:
+  if _worker_as_bytes:
+    return [_worker_template.message(context, _worker_registry).as_bytes() for context in contexts]
+  return [_worker_template.message(context, _worker_registry) for context in contexts]
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+  """
+  Splits an iterable into lists of at most `size` items
+
+  :param items: Items to split
+  :param size: Maximum size of each list
+  """
+  iterator = iter(items)
+  while True:
+    chunk = list(islice(iterator, size))
+    if not chunk:
+      return
+    yield chunk
+
+
+def render_many(
+    email: EMail | Template,
+    contexts: Iterable[dict],
+    workers: Optional[int] = None,
+    chunksize: int = 256,
+    prefetch: int = 2,
+    as_bytes: bool = False
+  ) -> Iterator[EmailMessage | bytes]:
+  """
+  Render an e-mail for each recipient context, in order
+
+  The e-mail is compiled once, and contexts are consumed lazily, so
+  only a bounded number of messages are held in memory at once.
+  Attachments are encoded once per batch (or per worker process),
+  and their parts are shared by the messages
+
+  :param email: The e-mail, or a compiled template of it
+  :param contexts: Slot values for each recipient
+  :param workers: Number of worker processes, or None to render in this process
+  :param chunksize: Number of contexts sent to a worker at a time
+  :param prefetch: Number of chunks queued per worker
+  :param as_bytes: Yield the serialised messages instead, which are
+                   much cheaper to send back from worker processes
+
+  :return: An iterator over the rendered EmailMessage objects
+  """
+  template = email.compile() if isinstance(email, EMail) else email
+
+  if not workers:
+    registry = AttachmentRegistry()
+    for context in contexts:
+      msg = template.message(context, registry)
+      yield msg.as_bytes() if as_bytes else msg
+    return
+
+  pool = ProcessPoolExecutor(
+      max_workers=workers,
+      initializer=_init_worker,
+      initargs=(template, as_bytes)
+  )
+  pending = deque()
+  try:
+    for chunk in chunked(contexts, chunksize):
+      pending.append(pool.submit(_render_chunk, chunk))
+      if len(pending) >= workers * prefetch:
+        yield from pending.popleft().result()
+    while pending:
+      yield from pending.popleft().result()
+  finally:
+    for future in pending:
+      future.cancel()
+    pool.shutdown()
@@ -1,28 +1,171 @@
-from ..utils import const, parse_style, parse_properties, TagStripper
-from typing import Any, Optional
+from ..context import RenderContext
+from ..fragments import fragment_cache
+from ..utils import const, parse_style, parse_properties, inherit_style, freeze, freeze_style, ReadOnlyDict, TagStripper
+from collections.abc import Mapping
+from typing import Any, Iterator, Optional
+
+import inspect
+import time
+import weakref
+
+# Shared by every component created without custom style rules or properties
+empty_style = ReadOnlyDict()
+empty_properties = ReadOnlyDict()
+
+# Attributes of components whose slots were never set
+_defaults = {
+    "style": empty_style,
+    "properties": empty_properties,
+    "_parents": None,
+    "_html_cache": None,
+    "_plain_cache": None,
+    "_html_flat": None,
+    "_plain_flat": None,
+    "_fragment": False,
+    "_fingerprint": None,
+    "_shared": False
+}
 
 
 class Element:
-  pass
+  __slots__ = ()
 
 class Component(Element):
   """
   Base component class
 
+  When rendered with caching enabled (see `RenderContext.cache`),
+  components cache their output until one of their public attributes
+  (or one of their descendants') is assigned to. In-place changes, e.g.
+  to the `style` dict, must then be followed by `mark_dirty()`
+
+  Components are slotted, and those created without custom style rules
+  or properties share read-only empty mappings, so large trees stay
+  small in memory. Subclasses that don't call `Component.__init__` get
+  the default attributes
+
   :param style: Custom style rules
   """
 
+  __slots__ = ("style", "properties", "_parents", "_html_cache", "_plain_cache",
+               "_html_flat", "_plain_flat", "_fragment", "_fingerprint", "_shared", "__weakref__")
+
+  keys = ("global",)
+
   def __init__(self, style: Optional[dict] = None, properties: Optional[dict] = None) -> None:
-    if style is None:
-      style = {}
-    if properties is None:
-      properties = {}
-    self.style = style
-    self.properties = properties
-    self.keys = ["global"]
-    self.email = None
+    self._parents = None
+    self._html_cache = None
+    self._plain_cache = None
+    self._html_flat = None
+    self._plain_flat = None
+    self._fragment = False
+    self._fingerprint = None
+    self._shared = False
+    self.style = empty_style if style is None else style
+    self.properties = empty_properties if properties is None else properties
+
+  def __getattr__(self, name: str) -> Any:
+    # Only reached for unset slots, e.g. when a subclass' __init__
+    # doesn't call Component.__init__
+    try:
+      return _defaults[name]
+    except KeyError:
+      raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'") from None
+
+  def __setattr__(self, name: str, value: Any) -> None:
+    object.__setattr__(self, name, value)
+    if name[0] != "_":
+      self.mark_dirty()
+
+  def __getstate__(self) -> tuple:
+    # Parent links are weak references, which can't be pickled,
+    # so they are rebuilt by the parents when they are unpickled
+    _slots = {}
+    for name in _slot_names(type(self)):
+      if name != "_parents" and hasattr(self, name):
+        _slots[name] = getattr(self, name)
+    return getattr(self, "__dict__", None), _slots
+
+  def __setstate__(self, state: Any) -> None:
+    _dict, _slots = state if isinstance(state, tuple) else (state, None)
+    for values in (_dict, _slots):
+      for name, value in (values or {}).items():
+        object.__setattr__(self, name, value)
+
+  def mark_dirty(self) -> None:
+    """
+    Drops the cached output of the component and of its ancestors
+    """
+    if (not self._parents and self._html_cache is None and self._plain_cache is None
+        and self._html_flat is None and self._plain_flat is None and self._fingerprint is None):
+      return
+    stack = [self]
+    while stack:
+      node = stack.pop()
+      # Descendants of a fragment may have no output of their own, but
+      # the fragment's fingerprint and shared output depend on them
+      if (node is not self and node._html_cache is None and node._plain_cache is None
+          and node._fingerprint is None and not node._shared):
+        continue
+      node._html_cache = None
+      node._plain_cache = None
+      node._html_flat = None
+      node._plain_flat = None
+      node._fingerprint = None
+      stack.extend(_iter_parents(node))
 
-  def apply_style(self, style: dict) -> dict:
+  def as_fragment(self) -> "Component":
+    """
+    Marks the component as a fragment, whose rendered output is shared
+    through a process-wide cache with every structurally identical
+    fragment, e.g. the same header or footer in many e-mails
+
+    :return: The component itself
+    """
+    self._fragment = True
+    return self
+
+  def cacheable(self) -> bool:
+    """
+    Whether the component's rendered output is kept, e.g. components
+    whose output is too large to hold in memory aren't cacheable
+
+    :return: Whether the output is cached
+    """
+    return True
+
+  def fingerprint(self) -> Optional[tuple]:
+    """
+    Gets the structure and contents of the component's subtree
+
+    :return: The subtree's fingerprint, or None if some of its
+             attributes can't be compared by value
+    """
+    if self._fingerprint is None:
+      tokens = []
+      stack = [self]
+      while stack:
+        node = stack.pop()
+        if not issubclass(type(node), Component):
+          tokens.append(str(node))
+          continue
+        state = []
+        for name, value in _public_state(node):
+          frozen = freeze(value)
+          if frozen is None and value is not None:
+            return None
+          state.append((name, frozen))
+        tokens.append((type(node).__qualname__, tuple(state)))
+        if node is not self:
+          # Changing a descendant must reach this fingerprint
+          node._shared = True
+        if issubclass(type(node), Container):
+          tokens.append(len(node.children))
+          stack.extend(reversed(node.children))
+      self._fingerprint = tuple(tokens)
+    return self._fingerprint
+
+  def apply_style(self, style: Mapping) -> dict:
     """
     Concatenates the component's inherited
     style rules with its custom ones
@@ -30,31 +173,86 @@ class Component(Element):
     _applied_style = {}
 
     for key, value in style.items():
-      if key in self.keys and type(value) is dict:
+      if key in self.keys and isinstance(value, Mapping):
         for attr, value in value.items():
           _applied_style[attr] = value
 
     return _applied_style
 
-  def html(self, style) -> str:
+  def html(self, style, context: Optional[RenderContext] = None) -> str:
     """
     Renders the HTML code for the component
 
     :param style : The component's inherited style rules
+    :param context: The render's state
 
     :return: The HTML code for the component
     """
     _style = style
     return ""
 
-  def plain(self) -> str:
+  def iter_html(self, style: Mapping, context: Optional[RenderContext] = None) -> Iterator[str]:
+    """
+    Renders the HTML code for the component, in chunks
+
+    :param style : The component's inherited style rules
+    :param context: The render's state
+
+    :return: An iterator over the HTML chunks
+    """
+    yield _call(self, "html", style, context=context)
+
+  def iter_cached_html(self, style: Mapping, context: RenderContext) -> Iterator[str]:
+    """
+    Renders the HTML code for the component, in chunks, reusing its
+    cached output if it was last rendered with the same inherited style
+
+    :param style : The component's inherited style rules
+    :param context: The render's state
+
+    :return: An iterator over the HTML chunks
+    """
+    yield from render_tree(self, True, style, context)
+
+  def plain(self, context: Optional[RenderContext] = None) -> str:
     """
     Gets the component as plain text
 
+    :param context: The render's state
+
     :return: The component as plain text
     """
     return ""
 
+  def write_plain(self, out: list, context: RenderContext) -> None:
+    """
+    Writes the component as plain text into a buffer
+
+    :param out: The buffer, a list of strings
+    :param context: The render's state
+    """
+    out.append(_call(self, "plain", context=context))
+
+  def write_cached_plain(self, out: list, context: RenderContext) -> None:
+    """
+    Writes the component as plain text into a buffer,
+    reusing its cached output
+
+    :param out: The buffer, a list of strings
+    :param context: The render's state
+    """
+    out.extend(render_tree(self, False, context, context))
+
+  def cached_plain(self, context: RenderContext) -> str:
+    """
+    Gets the component as plain text, reusing its cached output
+
+    :param context: The render's state
+
+    :return: The component as plain text
+    """
+    return "".join(render_tree(self, False, context, context))
+
 
 class Container(Component):
   """
@@ -63,13 +261,15 @@ class Container(Component):
   :param style: Custom style rules
   """
 
+  __slots__ = ("children",)
+
+  keys = ("global", "container")
+  before = "<div style={style}>"
+  after = "</div>"
+
   def __init__(self, style=None, properties: Optional[dict] = None) -> None:
     super().__init__(style, properties)
     self.children = []
-    self.before = "<div style={style}>"
-    self.after = "</div>"
-    self.keys.extend(["container"])
-    self.indent = ""
 
   def append(self, item: str | Component) -> None:
     """
@@ -77,95 +277,270 @@ class Container(Component):
 
     :param item: Component or text to append
     """
+    if issubclass(type(item), Component):
+      _link(item, self)
     self.children.append(item)
+    self.mark_dirty()
 
-  def render_child(self, child: Any, style: dict) -> str:
+  def remove(self, item: str | Component) -> None:
     """
-    Renders a child component to HTML
+    Removes a child component or text from the container
+
+    :param item: Component or text to remove
+    """
+    self.children.remove(item)
+    if issubclass(type(item), Component) and not any(child is item for child in self.children):
+      _unlink(item, self)
+    self.mark_dirty()
+
+  def __setstate__(self, state: Any) -> None:
+    super().__setstate__(state)
+    for child in self.children:
+      if issubclass(type(child), Component):
+        _link(child, self)
+
+  def html_child(self, child: Any) -> tuple:
+    """
+    Gets the HTML code wrapped around a child
+
+    :param child: The child component or text
+
+    :return: The HTML code before and after the child
+    """
+    if issubclass(type(child), Component):
+      return "", ""
+    return "", "<br/>"
+
+  def plain_child(self, index: int, child: Any, context: RenderContext) -> tuple:
+    """
+    Gets the plain text wrapped around a child, and the child's context
+
+    :param index: The child's position in the container
+    :param child: The child component or text
+    :param context: The container's render state
+
+    :return: The text before the child, the child's context, the number
+             of characters dropped from the start of the child's text,
+             and the text after the child
+    """
+    if issubclass(type(child), Container):
+      return "", context.child(), 0, ""
+    return context.indent, context.child(), 0, "\n"
+
+  def iter_child(self, child: Any, style: Mapping, context: RenderContext) -> Iterator[str]:
+    """
+    Renders a child component to HTML, in chunks
 
     :param child: Component to render
     :param style: The style rules the child will inherit
+    :param context: The render's state
 
-    :return: The rendered HTML
+    :return: An iterator over the HTML chunks
     """
+    before, after = self.html_child(child)
+    yield before
     if issubclass(type(child), Component):
-      child.email = self.email
-      return child.html(style)
+      yield from child.iter_cached_html(style, context)
     else:
-      return f"{str(child)}<br/>"
+      yield str(child)
+    yield after
 
-  def render_children(self, style: dict) -> str:
+  def render_child(self, child: Any, style: Mapping, context: Optional[RenderContext] = None) -> str:
     """
-    Renders the container's children to HTML
+    Renders a child component to HTML
 
-    :param style: The style rules the child components will inherit
+    :param child: Component to render
+    :param style: The style rules the child will inherit
+    :param context: The render's state
 
     :return: The rendered HTML
     """
+    if context is None:
+      context = RenderContext()
+    return "".join(self.iter_child(child, style, context))
+
+  def inherited_style(self, style: Mapping) -> Mapping:
+    """
+    Gets the style rules the container's children inherit
+
+    The passable attributes are written into the inherited global rules,
+    so they also apply to the components rendered after the container
+
+    :param style: The container's inherited style rules
+
+    :return: The children's inherited style rules
+    """
     _style = {**self.apply_style(style), **self.style}
     _append_style = {}
     for key in self.keys:
       if key != "global":
         _append_style[key] = self.style
-    _combined_style = {**style, **_append_style}
 
+    _global = style.get("global")
+    if _global is None:
+      _global = _append_style["global"] = {}
     _passable_attrs = ["color", "font-family", "font-size", "font-weight"]
     for attr in _passable_attrs:
-      # print(f"{attr}: {attr in self.apply_style(style).keys()}")
       if attr in _style.keys():
-        _combined_style["global"][attr] = _style[attr]
+        _global[attr] = _style[attr]
+    return inherit_style(style, _append_style)
 
-    _html = ""
-    for i, child in enumerate(self.children):
-      _html += self.render_child(child, _combined_style)
-    return _html
+  def iter_children(self, style: Mapping, context: RenderContext) -> Iterator[str]:
+    """
+    Renders the container's children to HTML, in chunks
 
-  def html(self, style) -> str:
-    _style = {**self.apply_style(style), **self.style}
-    # if self.email.table: # type: ignore
+    :param style: The container's inherited style rules
+    :param context: The render's state
+
+    :return: An iterator over the HTML chunks
+    """
+    _combined_style = self.inherited_style(style)
+    # Containers customised through `render_child`, as they were
+    # before `iter_child` existed, still render through it
+    custom = type(self).render_child is not Container.render_child
+    for child in self.children:
+      if custom:
+        yield _call(self, "render_child", child, _combined_style, context=context)
+      else:
+        yield from self.iter_child(child, _combined_style, context)
+
+  def render_children(self, style: Mapping, context: Optional[RenderContext] = None) -> str:
+    """
+    Renders the container's children to HTML
+
+    :param style: The container's inherited style rules
+    :param context: The render's state
+
+    :return: The rendered HTML
+    """
+    if context is None:
+      context = RenderContext()
+    return "".join(self.iter_children(style, context))
+
+  def has_child_container(self) -> bool:
     has_child_container = False
     for child in self.children:
       if child is Container:
         has_child_container = True
-    if has_child_container:
-      return f"""<tr>
+    return has_child_container
+
+  def iter_html_open(self, style: Mapping, context: RenderContext) -> Iterator[str]:
+    """
+    Renders the HTML code before the container's children, in chunks
+
+    :param style: The container's inherited style rules
+    :param context: The render's state
+
+    :return: An iterator over the HTML chunks
+    """
+    _style = {**self.apply_style(style), **self.style}
+    if context.compact:
+      _properties = parse_properties(self.properties)
+      _attributes = f"style=\"{parse_style(_style)}\"{' ' + _properties if _properties else ''}"
+      if self.has_child_container():
+        yield f"<tr><td {_attributes}><table border=\"0\" cellspacing=\"0\" cellpadding=\"0\" {_attributes}>"
+      else:
+        yield f"<tr><td {_attributes}>"
+      return
+    # if self.email.table: # type: ignore
+    if self.has_child_container():
+      yield f"""<tr>
                     <td style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>
                       <table border=\"0\" cellspacing=\"0\" cellpadding=\"0\" style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>
-                        {self.render_children(style)}
+                        """
+    else:
+      yield f"""<tr>
+                    <td style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>
+                      """
+
+  def iter_html_close(self, style: Mapping, context: RenderContext) -> Iterator[str]:
+    """
+    Renders the HTML code after the container's children, in chunks
+
+    :param style: The container's inherited style rules
+    :param context: The render's state
+
+    :return: An iterator over the HTML chunks
+    """
+    if context.compact:
+      yield "</table></td></tr>" if self.has_child_container() else "</td></tr>"
+    elif self.has_child_container():
+      yield """
                       </table>
                     </td>
                   </tr>"""
     else:
-      return f"""<tr>
-                    <td style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>
-                      {self.render_children(style)}
+      yield """
                     </td>
                   </tr>"""
 
-  def plain(self) -> str:
-    _tab = self.indent
-    _plain = ""
-    for child in self.children:
-      if issubclass(type(child), Container):
-        child.indent = self.indent
-        _plain += f"{child.plain()}"
-      elif issubclass(type(child), Component):
-        _plain += f"{_tab}{child.plain()}\n"
-      else:
-        _plain += f"{_tab}{str(child)}\n"
-    return _plain
+  def iter_plain_open(self, context: RenderContext) -> Iterator[str]:
+    """
+    Gets the plain text before the container's children, in chunks
+
+    :param context: The render's state
+
+    :return: An iterator over the text chunks
+    """
+    return iter(())
+
+  def iter_plain_close(self, context: RenderContext) -> Iterator[str]:
+    """
+    Gets the plain text after the container's children, in chunks
+
+    :param context: The render's state
+
+    :return: An iterator over the text chunks
+    """
+    return iter(())
+
+  def iter_html(self, style: Mapping, context: Optional[RenderContext] = None) -> Iterator[str]:
+    if context is None:
+      context = RenderContext()
+    if type(self).html is not Container.html:
+      yield _call(self, "html", style, context=context)
+    else:
+      yield from self._iter_html(style, context)
+
+  def _iter_html(self, style: Mapping, context: RenderContext) -> Iterator[str]:
+    # Renders the container through its hooks, honouring the
+    # `render_children` and `render_child` overrides
+    if _expands(self, True):
+      yield from render_tree(self, True, style, context, cached=False)
+      return
+    yield from self.iter_html_open(style, context)
+    if type(self).render_children is not Container.render_children:
+      yield _call(self, "render_children", style, context=context)
+    else:
+      yield from self.iter_children(style, context)
+    yield from self.iter_html_close(style, context)
+
+  def html(self, style, context: Optional[RenderContext] = None) -> str:
+    if context is None:
+      context = RenderContext()
+    return "".join(self._iter_html(style, context))
+
+  def plain(self, context: Optional[RenderContext] = None) -> str:
+    if context is None:
+      context = RenderContext()
+    return "".join(render_tree(self, False, context, context, cached=False))
+
+  def write_plain(self, out: list, context: RenderContext) -> None:
+    if type(self).plain is not Container.plain:
+      out.append(_call(self, "plain", context=context))
+    else:
+      out.extend(render_tree(self, False, context, context, cached=False))
+
 
 class Custom(Component):
+  __slots__ = ("html_string", "plain_text")
+
   def __init__(self, html: str, plain_text: str = "", style: Optional[dict] = None) -> None:
-    self.email = None
+    super().__init__(style)
     self.html_string = html
     self.plain_text = plain_text
-    self.keys = ["global"]
-    if style is None:
-      style = {}
-    self.style = style
 
-  def html(self, style) -> str:
+  def html(self, style, context: Optional[RenderContext] = None) -> str:
     """
     Renders the HTML code for the component
 
@@ -174,7 +549,7 @@ class Custom(Component):
     _style = {**self.apply_style(style), **self.style}
     return f"<div style=\"{parse_style(_style)}\">{self.html_string}</div>"
 
-  def plain(self) -> str:
+  def plain(self, context: Optional[RenderContext] = None) -> str:
     """
     Gets the component as plain text
 
@@ -183,5 +558,491 @@ class Custom(Component):
     if self.plain_text == "":
       s = TagStripper()
       s.feed(self.html_string)
-      self.plain_text = s.get_data()
+      return s.get_data()
     return self.plain_text
+
+
+def _link(node: Component, parent: Container) -> None:
+  """
+  Records a component's parent, through a weak reference, or a weak set
+  for components shared by several parents
+  """
+  parents = node._parents
+  if parents is None:
+    node._parents = weakref.ref(parent)
+  elif type(parents) is weakref.ref:
+    _parent = parents()
+    if _parent is None:
+      node._parents = weakref.ref(parent)
+    elif _parent is not parent:
+      node._parents = weakref.WeakSet((_parent, parent))
+  else:
+    parents.add(parent)
+
+
+def _unlink(node: Component, parent: Container) -> None:
+  """
+  Drops a component's parent
+  """
+  parents = node._parents
+  if type(parents) is weakref.ref:
+    if parents() is parent:
+      node._parents = None
+  elif parents is not None:
+    parents.discard(parent)
+
+
+def _iter_parents(node: Component) -> Any:
+  """
+  Gets a component's live parents
+  """
+  parents = node._parents
+  if parents is None:
+    return ()
+  if type(parents) is weakref.ref:
+    parent = parents()
+    return () if parent is None else (parent,)
+  return parents
+
+
+_context_methods = {}
+
+
+def _takes_context(method: Any, count: int) -> bool:
+  """
+  Whether a rendering method takes the render's context after its other
+  `count` arguments, including `self`, unlike custom components written
+  for the original `html(self, style)` and `plain(self)` signatures
+  """
+  takes = _context_methods.get(method)
+  if takes is None:
+    try:
+      parameters = inspect.signature(method).parameters.values()
+    except (TypeError, ValueError):
+      takes = True
+    else:
+      positional = [
+          parameter for parameter in parameters
+          if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+      ]
+      takes = len(positional) > count or any(parameter.kind is parameter.VAR_POSITIONAL for parameter in parameters)
+    _context_methods[method] = takes
+  return takes
+
+
+def _call(component: Component, name: str, *args: Any, context: Optional[RenderContext]) -> Any:
+  """
+  Calls one of a component's rendering methods, passing the render's
+  context only if the method takes it
+  """
+  method = getattr(type(component), name)
+  if _takes_context(method, len(args) + 1):
+    return method(component, *args, context)
+  return method(component, *args)
+
+
+_type_slots = {}
+
+
+def _slot_names(_type: type) -> tuple:
+  """
+  Gets the names of a component class' slots, across its bases
+  """
+  names = _type_slots.get(_type)
+  if names is None:
+    names = set()
+    for klass in _type.__mro__:
+      slots = klass.__dict__.get("__slots__", ())
+      names.update([slots] if isinstance(slots, str) else slots)
+    names.discard("__weakref__")
+    names.discard("__dict__")
+    names = tuple(sorted(names))
+    _type_slots[_type] = names
+  return names
+
+
+_state_names = {}
+
+
+def _public_state(node: Component) -> list:
+  """
+  Gets a component's public attributes, from its slots and its
+  `__dict__`, if it has one
+
+  :param node: The component
+
+  :return: The attributes' names and values, sorted by name
+  """
+  _type = type(node)
+  names = _state_names.get(_type)
+  if names is None:
+    names = tuple(name for name in _slot_names(_type) if name[0] != "_" and name != "children")
+    _state_names[_type] = names
+  state = {name: getattr(node, name) for name in names if hasattr(node, name)}
+  for name, value in getattr(node, "__dict__", {}).items():
+    if name[0] != "_" and name != "children":
+      state[name] = value
+  return sorted(state.items())
+
+
+_tracer = None
+
+
+class _Frame:
+  """
+  A container being rendered by `render_tree`
+  """
+
+  __slots__ = ("node", "key", "fingerprint", "state", "child_state", "children",
+               "pieces", "after", "skip", "store", "live", "started", "emitted")
+
+  def __init__(self, node, key, fingerprint, state, child_state, skip, store, started, emitted) -> None:
+    self.node = node
+    self.key = key
+    self.fingerprint = fingerprint
+    self.state = state
+    self.child_state = child_state
+    self.children = enumerate(node.children)
+    self.pieces = []
+    self.after = ""
+    self.skip = skip
+    self.store = store
+    self.live = False
+    self.started = started
+    self.emitted = emitted
+
+
+class _Live:
+  """
+  A component whose output isn't cached, rendered again whenever its
+  ancestors' cached output is reused
+  """
+
+  __slots__ = ("node", "state")
+
+  def __init__(self, node, state) -> None:
+    self.node = node
+    self.state = state
+
+
+class _Cascade:
+  """
+  Attributes a container passed down through the global rules, written
+  into them again whenever its ancestors' cached output is reused
+  """
+
+  __slots__ = ("rules",)
+
+  def __init__(self, rules) -> None:
+    self.rules = rules
+
+
+def _cascaded(rules: Mapping, before: dict) -> Optional[_Cascade]:
+  _rules = {attr: value for attr, value in rules.items() if attr not in before or before[attr] != value}
+  return _Cascade(_rules) if _rules else None
+
+
+# Methods a container can override to render itself, instead of through
+# the hooks `render_tree` expands
+_html_overrides = ("html", "iter_html", "render_children", "iter_children", "render_child", "iter_child")
+
+_expanding = {}
+
+
+def _expands(node: Component, html: bool) -> bool:
+  _type = type(node)
+  expands = _expanding.get((_type, html))
+  if expands is None:
+    if not issubclass(_type, Container):
+      expands = False
+    elif html:
+      expands = all(getattr(_type, name) is getattr(Container, name) for name in _html_overrides)
+    else:
+      expands = _type.plain is Container.plain
+    _expanding[(_type, html)] = expands
+  return expands
+
+
+def _trim(pending: list, chunk: str) -> str:
+  while pending and chunk:
+    count = pending[-1]
+    if len(chunk) < count[0]:
+      count[0] -= len(chunk)
+      return ""
+    chunk = chunk[count[0]:]
+    pending.pop()
+  return chunk
+
+
+def render_tree(root: Component, html: bool, state: Any, context: RenderContext, cached: bool = True) -> Iterator[str]:
+  """
+  Renders a component's subtree to HTML or plain text, in chunks
+
+  The tree is walked with an explicit stack, so it can be arbitrarily
+  deep. Each component caches its own chunks and references to its
+  children's cached output, so rendering and caching stay linear in
+  the size of the output. Components that aren't `cacheable()`, and
+  every component when the context doesn't `cache`, are rendered
+  without keeping their output
+
+  :param root: The component to render
+  :param html: Whether to render HTML, or plain text
+  :param state: The component's inherited style rules, for HTML,
+                or its render state, for plain text
+  :param context: The render's state
+  :param cached: Whether to reuse and cache the root's own output
+
+  :return: An iterator over the chunks
+  """
+  attachments = context.attachments if html else None
+  phase = "html" if html else "plain"
+  tracer = _tracer
+  stack = []
+  pending = []
+  emitted = 0
+  visit = (root, state, 0)
+
+  while True:
+    if visit is not None:
+      node, state, skip = visit
+      visit = None
+      skip = [skip] if skip else None
+      if skip is not None:
+        pending.append(skip)
+      started = time.perf_counter() if tracer is not None else 0.0
+      start = emitted
+      reuse = (cached or node is not root) and node.cacheable()
+      store = reuse and context.cache
+      if not html:
+        key = (state.indent, state.order_prefix)
+      elif context.compact:
+        key = ("compact", freeze_style(state))
+      else:
+        key = freeze_style(state)
+
+      entry = None
+      fingerprint = None
+      if reuse:
+        cache = node._html_cache if html else node._plain_cache
+        if cache is not None and cache[0] == key:
+          entry = cache
+        elif node._fragment:
+          fingerprint = node.fingerprint()
+          if fingerprint is not None:
+            entry = fragment_cache.get((phase, fingerprint, key))
+            if entry is not None and store:
+              if html:
+                node._html_cache = entry
+              else:
+                node._plain_cache = entry
+      hit = entry is not None
+      cascade = state.get("global") if html and hit else None
+
+      flat = None
+      if hit and node is root:
+        flat = node._html_flat if html else node._plain_flat
+        if flat is not None and flat[0] is entry:
+          if attachments is not None:
+            attachments.replay(flat[2])
+          if cascade is not None:
+            cascade.update(flat[3])
+          emitted += len(flat[1])
+          yield flat[1]
+          hit = None
+        else:
+          flat = ([], [], {}) if store else None
+
+      if hit:
+        ropes = [(iter(entry[1]), None)]
+        skip_next = 0
+        while ropes:
+          piece = next(ropes[-1][0], None)
+          if piece is None:
+            count = ropes.pop()[1]
+            if count is not None and pending and pending[-1] is count:
+              pending.pop()
+          elif isinstance(piece, str):
+            chunk = _trim(pending, piece) if pending else piece
+            if chunk:
+              if flat is not None:
+                flat[0].append(chunk)
+              emitted += len(chunk)
+              yield chunk
+          elif isinstance(piece, tuple):
+            count = None
+            if skip_next:
+              count = [skip_next]
+              pending.append(count)
+              skip_next = 0
+            ropes.append((iter(piece[1]), count))
+          elif isinstance(piece, int):
+            skip_next = piece
+          elif isinstance(piece, _Live):
+            # Output that isn't kept can't be flattened either
+            flat = None
+            count = None
+            if skip_next:
+              count = [skip_next]
+              pending.append(count)
+              skip_next = 0
+            live_state = piece.state
+            if cascade is not None and live_state.get("global") is not cascade:
+              live_state = inherit_style(live_state, {"global": cascade})
+            for chunk in render_tree(piece.node, html, live_state, context):
+              chunk = _trim(pending, chunk) if pending else chunk
+              if chunk:
+                emitted += len(chunk)
+                yield chunk
+            if count is not None and pending and pending[-1] is count:
+              pending.pop()
+          elif isinstance(piece, _Cascade):
+            if flat is not None:
+              flat[2].update(piece.rules)
+            if cascade is not None:
+              cascade.update(piece.rules)
+          else:
+            if flat is not None:
+              flat[1].append(piece)
+            if attachments is not None:
+              attachments.replay([piece])
+        if flat is not None:
+          flat = (entry, "".join(flat[0]), flat[1], flat[2])
+          if html:
+            node._html_flat = flat
+          else:
+            node._plain_flat = flat
+      elif hit is None:
+        hit = True
+      elif (not cached and node is root) or _expands(node, html):
+        if html:
+          chunks = node.iter_html_open(state, context)
+        else:
+          chunks = node.iter_plain_open(state)
+        frame = _Frame(node, key, fingerprint, state, None, skip, store, started, start)
+        stack.append(frame)
+        for chunk in chunks:
+          if store:
+            frame.pieces.append(chunk)
+          chunk = _trim(pending, chunk) if pending else chunk
+          if chunk:
+            emitted += len(chunk)
+            yield chunk
+        if html:
+          # Only after the container's own style is worked out does it
+          # write the attributes it passes down into the global rules
+          cascade = state.get("global") if store else None
+          before = dict(cascade) if cascade is not None else None
+          frame.child_state = node.inherited_style(state)
+          if cascade is not None:
+            passed = _cascaded(cascade, before)
+            if passed is not None:
+              frame.pieces.append(passed)
+        continue
+      else:
+        if html:
+          recorded = attachments.record() if attachments is not None else []
+          cascade = state.get("global") if store and issubclass(type(node), Container) else None
+          before = dict(cascade) if cascade is not None else None
+          try:
+            chunks = list(node.iter_html(state, context))
+          finally:
+            if attachments is not None:
+              attachments.stop_recording()
+          pieces = (*chunks, *recorded)
+          if cascade is not None:
+            passed = _cascaded(cascade, before)
+            if passed is not None:
+              pieces = (*pieces, passed)
+        else:
+          chunks = [node.plain(state) if _takes_context(type(node).plain, 1) else node.plain()]
+          pieces = tuple(chunks)
+        if store:
+          entry = (key, pieces, False)
+          if html:
+            node._html_cache = entry
+          else:
+            node._plain_cache = entry
+          if fingerprint is not None:
+            fragment_cache.put((phase, fingerprint, key), entry)
+        for chunk in chunks:
+          chunk = _trim(pending, chunk) if pending else chunk
+          if chunk:
+            emitted += len(chunk)
+            yield chunk
+
+    else:
+      frame = stack[-1]
+      node = frame.node
+      item = next(frame.children, None)
+      if item is not None:
+        index, child = item
+        if html:
+          before, after = node.html_child(child)
+          child_state = frame.child_state
+          skip = 0
+        else:
+          before, child_state, skip, after = node.plain_child(index, child, frame.state)
+        if not issubclass(type(child), Component):
+          before = f"{before}{str(child)}{after}"
+          after = ""
+        if before:
+          if frame.store:
+            frame.pieces.append(before)
+          chunk = _trim(pending, before) if pending else before
+          if chunk:
+            emitted += len(chunk)
+            yield chunk
+        if issubclass(type(child), Component):
+          frame.after = after
+          if skip and frame.store:
+            frame.pieces.append(skip)
+          visit = (child, child_state, skip)
+        continue
+
+      chunks = node.iter_html_close(frame.state, context) if html else node.iter_plain_close(frame.state)
+      for chunk in chunks:
+        if frame.store:
+          frame.pieces.append(chunk)
+        chunk = _trim(pending, chunk) if pending else chunk
+        if chunk:
+          emitted += len(chunk)
+          yield chunk
+      stack.pop()
+      entry = None
+      if frame.store:
+        # Entries referencing live components aren't shared between e-mails
+        entry = (frame.key, tuple(frame.pieces), frame.live)
+        if html:
+          node._html_cache = entry
+        else:
+          node._plain_cache = entry
+        if frame.fingerprint is not None and not frame.live:
+          fragment_cache.put((phase, frame.fingerprint, frame.key), entry)
+      state = frame.state
+      skip = frame.skip
+      started = frame.started
+      start = frame.emitted
+      hit = False
+
+    if skip is not None and pending and pending[-1] is skip:
+      pending.pop()
+    if tracer is not None:
+      tracer(type(node).__name__, phase, time.perf_counter() - started, emitted - start, hit)
+    if not stack:
+      return
+    frame = stack[-1]
+    if frame.store:
+      if entry is not None:
+        frame.pieces.append(entry)
+        frame.live = frame.live or entry[2]
+      else:
+        frame.pieces.append(_Live(node, state))
+        frame.live = True
+    if frame.after:
+      if frame.store:
+        frame.pieces.append(frame.after)
+      chunk = _trim(pending, frame.after) if pending else frame.after
+      frame.after = ""
+      if chunk:
+        emitted += len(chunk)
+        yield chunk
@@ -1,6 +1,9 @@
 from .base import Component, Container
+from ..context import RenderContext
 from ..utils import const, parse_style, parse_properties
-from typing import Any, Optional
+from collections.abc import Mapping
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
 
 
 class OrderedList(Container):
@@ -11,37 +14,30 @@ class OrderedList(Container):
   :param style: Custom style rules
   """
 
+  __slots__ = ()
+
   def __init__(self, style: Optional[dict] = None, properties: Optional[dict] = None, kwargs: Optional[dict] = None) -> None:
     super().__init__(style, properties)
-    self.order_prefix = ""
 
-  def render_child(self, child: Any, style: dict) -> str:
-    if issubclass(type(child), Component):
-      return f"<li>{child.html(style)}</li>"
-    else:
-      return f"<li>{str(child)}</li>"
+  def html_child(self, child: Any) -> tuple:
+    return "<li>", "</li>"
 
-  def html(self, style: dict) -> str:
+  def iter_html_open(self, style: Mapping, context: RenderContext) -> Iterator[str]:
     _style = {**self.apply_style(style), **self.style}
-    return f"<ol style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>{self.render_children(style)}</ol>"
-
-  def plain(self) -> str:
-    _tab = self.indent + ' ' * const["tab_size"]
-    _plain = ""
-    for i, child in enumerate(self.children):
-      _prefix = f"{self.order_prefix}{i+1}."
-      if issubclass(type(child), OrderedList):
-        child.indent = _tab
-        child.order_prefix = _prefix
-        _plain += f"{child.plain()}"
-      elif issubclass(type(child), Container):
-        child.indent = _tab + (" " * (len(_prefix) + 1))
-        _plain += f"{_tab}{_prefix} {child.plain()[(len(_tab + _prefix) + 1):]}"
-      elif issubclass(type(child), Component):
-        _plain += f"{_tab}{_prefix} {child.plain()}\n"
-      else:
-        _plain += f"{_tab}{_prefix} {str(child)}\n"
-    return _plain
+    yield f"<ol style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>"
+
+  def iter_html_close(self, style: Mapping, context: RenderContext) -> Iterator[str]:
+    yield "</ol>"
+
+  def plain_child(self, index: int, child: Any, context: RenderContext) -> tuple:
+    _tab = context.indent + ' ' * const["tab_size"]
+    _prefix = f"{context.order_prefix}{index+1}."
+    if issubclass(type(child), OrderedList):
+      return "", context.child(_tab, _prefix), 0, ""
+    if issubclass(type(child), Container):
+      _child_context = context.child(_tab + (" " * (len(_prefix) + 1)))
+      return f"{_tab}{_prefix} ", _child_context, len(_tab + _prefix) + 1, ""
+    return f"{_tab}{_prefix} ", context.child(), 0, "\n"
 
 
 class UnorderedList(Container):
@@ -53,37 +49,31 @@ class UnorderedList(Container):
   :param style: Custom style rules
   """
 
+  __slots__ = ("decorator",)
+
   def __init__(self, decorator: str = "*", style: Optional[dict] = None, properties: Optional[dict] = None, kwargs: Optional[dict] = None) -> None:
     super().__init__(style, properties)
     self.decorator = decorator + " "
 
 
-  def render_child(self, child: Any, style: dict) -> str:
-    if issubclass(type(child), Component):
-      return f"<li>{child.html(style)}</li>"
-    else:
-      return f"<li>{str(child)}</li>"
+  def html_child(self, child: Any) -> tuple:
+    return "<li>", "</li>"
 
-  def html(self, style: dict) -> str:
+  def iter_html_open(self, style: Mapping, context: RenderContext) -> Iterator[str]:
     _style = {**self.apply_style(style), **self.style}
-    return f"<ul style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>{self.render_children(style)}</ul>"
-
-  def plain(self) -> str:
-    _tab = self.indent + ' ' * const["tab_size"]
-    _plain = ""
-    for i, child in enumerate(self.children):
-      if issubclass(type(child), UnorderedList):
-        child.indent = _tab
-        _plain += child.plain()
-      elif issubclass(type(child), Container):
-        child.indent = _tab + (" " * len(self.decorator))
-        _plain += _tab + self.decorator + \
-            child.plain()[len(_tab + self.decorator):]
-      elif issubclass(type(child), Component):
-        _plain += _tab + self.decorator + child.plain() + "\n"
-      else:
-        _plain += _tab + self.decorator + str(child) + "\n"
-    return _plain
+    yield f"<ul style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>"
+
+  def iter_html_close(self, style: Mapping, context: RenderContext) -> Iterator[str]:
+    yield "</ul>"
+
+  def plain_child(self, index: int, child: Any, context: RenderContext) -> tuple:
+    _tab = context.indent + ' ' * const["tab_size"]
+    if issubclass(type(child), UnorderedList):
+      return "", context.child(_tab), 0, ""
+    if issubclass(type(child), Container):
+      _child_context = context.child(_tab + (" " * len(self.decorator)))
+      return _tab + self.decorator, _child_context, len(_tab + self.decorator), ""
+    return _tab + self.decorator, context.child(), 0, "\n"
 
 
 class Table(Container):
@@ -92,32 +82,192 @@ class Table(Container):
   A table element (W.I.P.)
   <TABLE />
 
+  Large tables should be built with `Table.from_rows` or
+  `Table.from_columns`, whose cells are rendered without
+  going through the component tree. Tables with more than
+  `cache_rows` rows aren't cached, so streaming them doesn't
+  keep their output in memory
+
   :param style: Custom style rules
   """
 
-  def render_child(self, child: Any, style: dict,  kwargs: Optional[dict] = None) -> str:
-    if issubclass(type(child), Component):
-      return child.html(style)
-    else:
-      return str(child)
+  __slots__ = ("header", "rows", "column_styles", "formatters")
+
+  cache_rows = 1000
+
+  def __init__(self, style: Optional[dict] = None, properties: Optional[dict] = None) -> None:
+    super().__init__(style, properties)
+    self.header = None
+    self.rows = []
+    self.column_styles = []
+    self.formatters = []
+
+  @classmethod
+  def from_rows(
+      cls,
+      rows: Iterable[Sequence],
+      header: Optional[Sequence] = None,
+      column_styles: Optional[Sequence[Optional[dict]]] = None,
+      formatters: Optional[Sequence[Optional[Callable]]] = None,
+      style: Optional[dict] = None,
+      properties: Optional[dict] = None
+    ) -> "Table":
+    """
+    Creates a table from a sequence of rows
+
+    :param rows: The table's rows, as sequences of cell values
+    :param header: The column headers
+    :param column_styles: Custom style rules for each column's cells
+    :param formatters: Functions converting each column's values to text, defaults to `str`
+    :param style: Custom style rules
+
+    :return: The table
+    """
+    table = cls(style, properties)
+    table.header = header
+    table.rows = rows if isinstance(rows, list) else list(rows)
+    table.column_styles = list(column_styles or [])
+    table.formatters = list(formatters or [])
+    return table
+
+  @classmethod
+  def from_columns(
+      cls,
+      columns: Sequence[Sequence],
+      header: Optional[Sequence] = None,
+      column_styles: Optional[Sequence[Optional[dict]]] = None,
+      formatters: Optional[Sequence[Optional[Callable]]] = None,
+      style: Optional[dict] = None,
+      properties: Optional[dict] = None
+    ) -> "Table":
+    """
+    Creates a table from a sequence of columns
+
+    :param columns: The table's columns, as sequences of cell values
+    :param header: The column headers
+    :param column_styles: Custom style rules for each column's cells
+    :param formatters: Functions converting each column's values to text, defaults to `str`
+    :param style: Custom style rules
+
+    :return: The table
+    """
+    return cls.from_rows(list(zip(*columns)), header, column_styles, formatters, style, properties)
+
+  def cacheable(self) -> bool:
+    return len(self.rows) <= self.cache_rows
+
+  def _column_count(self) -> int:
+    _count = max(len(self.column_styles), len(self.formatters))
+    if self.header is not None:
+      _count = max(_count, len(self.header))
+    if self.rows:
+      _count = max(_count, max(map(len, self.rows)))
+    return _count
 
-  def html(self, style: dict) -> str:
+  def iter_cells(self) -> Iterator[list]:
+    """
+    Formats the table's rows
+
+    :return: An iterator over each row's cells, as text
+    """
+    _formatters = [str] * self._column_count()
+    for i, formatter in enumerate(self.formatters):
+      if formatter is not None:
+        _formatters[i] = formatter
+    for row in self.rows:
+      yield [formatter(value) for formatter, value in zip(_formatters, row)]
+
+  def iter_rows(self) -> Iterator[str]:
+    """
+    Renders the table's rows to HTML, in chunks
+
+    :return: An iterator over the HTML chunks
+    """
+    _styles = [""] * self._column_count()
+    for i, column_style in enumerate(self.column_styles):
+      if column_style:
+        _styles[i] = f" style=\"{parse_style(column_style)}\""
+
+    if self.header is not None:
+      yield "<tr>" + "".join([
+          f"<th{column_style}>{title}</th>"
+          for column_style, title in zip(_styles, self.header)
+      ]) + "</tr>"
+
+    _prefixes = [f"<td{column_style}>" for column_style in _styles]
+    cells = self.iter_cells()
+    while True:
+      chunk = list(islice(cells, 256))
+      if not chunk:
+        return
+      yield "".join([
+          "<tr>" + "".join([
+              prefix + value + "</td>" for prefix, value in zip(_prefixes, row)
+          ]) + "</tr>"
+          for row in chunk
+      ])
+
+  def html_child(self, child: Any) -> tuple:
+    return "", ""
+
+  def iter_html_open(self, style: Mapping, context: RenderContext) -> Iterator[str]:
     _style = {**self.apply_style(style), **self.style}
-    return f"<table style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>{self.render_children(style)}</table>"
-
-  def plain(self) -> str:
-    _tab = self.indent + ' ' * const["tab_size"]
-    _plain = ""
-    for i, child in enumerate(self.children):
-      if issubclass(type(child), UnorderedList):
-        child.indent = _tab
-        _plain += child.plain()
-      elif issubclass(type(child), Container):
-        child.indent = _tab
-        _plain += _tab + \
-            child.plain()[len(_tab):]
-      elif issubclass(type(child), Component):
-        _plain += _tab + child.plain() + "\n"
-      else:
-        _plain += _tab + str(child) + "\n"
-    return _plain
+    yield f"<table style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>"
+
+  def iter_html_close(self, style: Mapping, context: RenderContext) -> Iterator[str]:
+    yield from self.iter_rows()
+    yield "</table>"
+
+  def plain_rows(self, context: Optional[RenderContext] = None) -> str:
+    """
+    Gets the table's rows as aligned plain text
+
+    :param context: The render's state
+
+    :return: The table's rows as plain text
+    """
+    if context is None:
+      context = RenderContext()
+    out = []
+    self.write_plain_rows(out, context)
+    return "".join(out)
+
+  def write_plain_rows(self, out: list, context: RenderContext) -> None:
+    """
+    Writes the table's rows as aligned plain text into a buffer
+
+    :param out: The buffer, a list of strings
+    :param context: The render's state
+    """
+    _tab = context.indent + ' ' * const["tab_size"]
+    _rows = list(self.iter_cells())
+    if self.header is not None:
+      _rows.insert(0, [str(title) for title in self.header])
+    if not _rows:
+      return
+
+    _widths = [0] * self._column_count()
+    for row in _rows:
+      for i, value in enumerate(row):
+        if len(value) > _widths[i]:
+          _widths[i] = len(value)
+
+    for i, row in enumerate(_rows):
+      out.append((_tab + "  ".join([value.ljust(width) for value, width in zip(row, _widths)])).rstrip())
+      out.append("\n")
+      if i == 0 and self.header is not None:
+        out.append(_tab + "  ".join(["-" * width for width in _widths]))
+        out.append("\n")
+
+  def plain_child(self, index: int, child: Any, context: RenderContext) -> tuple:
+    _tab = context.indent + ' ' * const["tab_size"]
+    if issubclass(type(child), UnorderedList):
+      return "", context.child(_tab), 0, ""
+    if issubclass(type(child), Container):
+      return _tab, context.child(_tab), len(_tab), ""
+    return _tab, context.child(), 0, "\n"
+
+  def iter_plain_close(self, context: RenderContext) -> Iterator[str]:
+    out = []
+    self.write_plain_rows(out, context)
+    return iter(out)
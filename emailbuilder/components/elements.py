@@ -1,4 +1,5 @@
 from .base import Component
+from ..context import RenderContext
 from ..utils import const, parse_style, parse_text, parse_properties
 from typing import Optional
 
@@ -12,16 +13,19 @@ class Header(Component):
   :param style: Custom style rules
   """
 
+  __slots__ = ("content",)
+
+  keys = ("global", "header")
+
   def __init__(self, content: str, style: Optional[dict] = None, properties: Optional[dict] = None) -> None:
     super().__init__(style, properties)
     self.content = content
-    self.keys.extend(["header"])
 
-  def html(self, style) -> str:
+  def html(self, style, context: Optional[RenderContext] = None) -> str:
     _style = {**self.apply_style(style), **self.style}
     return f"<h1 style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>{self.content}</h1>"
 
-  def plain(self) -> str:
+  def plain(self, context: Optional[RenderContext] = None) -> str:
     return f"# {self.content} #\n\n"
 
 
@@ -34,14 +38,17 @@ class Paragraph(Component):
   :param style: Custom style rules
   """
 
+  __slots__ = ("content",)
+
+  keys = ("global", "paragraph")
+
   def __init__(self, content: str, style: Optional[dict] = None, properties: Optional[dict] = None) -> None:
     super().__init__(style, properties)
     self.content = content
-    self.keys.extend(["paragraph"])
 
-  def html(self, style) -> str:
+  def html(self, style, context: Optional[RenderContext] = None) -> str:
     _style = {**self.apply_style(style), **self.style}
     return f"<p style=\"{parse_style(_style)}\" {parse_properties(self.properties)}>{parse_text(self.content)}</p>"
 
-  def plain(self) -> str:
+  def plain(self, context: Optional[RenderContext] = None) -> str:
     return f"{self.content}\n"
@@ -1,7 +1,7 @@
-import os
 from .base import Component
-from ..utils import const, parse_style, parse_text, fig_bytes
-from email.mime.image import MIMEImage
+from ..context import RenderContext
+from ..assets import asset_cache
+from ..utils import const, digest, parse_style, parse_text, fig_bytes
 from typing import Any, Optional
 
 
@@ -15,33 +15,33 @@ class Image(Component):
   :param style: Custom style rules
   """
 
+  __slots__ = ("alt", "src", "cid")
+
+  keys = ("global", "image")
+
   def __init__(self, src: str, alt: str = "", cid: Optional[str] = None, style: Optional[dict] = None, properties: Optional[dict] = None) -> None:
     super().__init__(style, properties)
     self.alt = alt
     self.src = src
     if cid is None:
-#       cid = src.split("\\")[-1].split("/")[-1]
-        cid = str(hash(src))
+      cid = digest(src)
     self.cid = cid
-    self.keys.extend(["image"])
 
-  def html(self, style: dict) -> str:
+  def html(self, style: dict, context: Optional[RenderContext] = None) -> str:
     _style = {**self.apply_style(style), **self.style}
-    with open(self.src, "rb") as img:
-      _image = MIMEImage(img.read())
-      _extension = os.path.basename(self.src)
-      if self.email:
-        self.email.attach(
-            item=img.read(),
-            mime=_image,
-            type="image",
-            extension=_extension,
-            cid=self.cid,
-            src=os.path.realpath(img.name)
-        )
-      return f"<img src=\"cid:{self.cid}\" style=\"{parse_style(_style)}\" alt=\"{self.alt}\" />"
-
-  def plain(self) -> str:
+    _asset = asset_cache.get(self.src)
+    if context is not None:
+      context.attach(
+          item=_asset.content,
+          type="image",
+          extension=_asset.extension,
+          cid=self.cid,
+          src=_asset.path,
+          asset=True
+      )
+    return f"<img src=\"cid:{self.cid}\" style=\"{parse_style(_style)}\" alt=\"{self.alt}\" />"
+
+  def plain(self, context: Optional[RenderContext] = None) -> str:
     return self.alt + "\n"
 
 
@@ -56,31 +56,31 @@ class ImageRaw(Component):
   :param style: Custom style rules
   """
 
+  __slots__ = ("alt", "image", "type", "cid")
+
+  keys = ("global", "image")
+
   def __init__(self, image: Any, extension: str, alt: str = "", cid: Optional[str] = None, style: Optional[dict] = None,properties: Optional[dict] = None) -> None:
     super().__init__(style, properties)
     self.alt = alt
     self.image = image
     self.type = extension
     if cid is None:
-      cid = str(hash(image))
+      cid = digest(image)
     self.cid = cid
-    self.keys.extend(["image"])
 
-  def html(self, style: dict) -> str:
+  def html(self, style: dict, context: Optional[RenderContext] = None) -> str:
     _style = {**self.apply_style(style), **self.style}
-    _image = MIMEImage(self.image)
-
-    if self.email:
-      self.email.attach(
+    if context is not None:
+      context.attach(
           item=self.image,
-          mime=_image,
           type="image",
           extension=self.type,
           cid=self.cid
       )
     return f"<img src=\"cid:{self.cid}\" style=\"{parse_style(_style)}\" alt=\"{self.alt}\" />"
 
-  def plain(self) -> str:
+  def plain(self, context: Optional[RenderContext] = None) -> str:
     return self.alt + "\n"
 
 
@@ -89,37 +89,88 @@ class Figure(Component):
   A matplotlib figure
 
   :param figure: The figure object
-  :param alt: Alternative text
+  :param alt: Alternative text, empty by default
   :param style: Custom style rules
   :param kwargs: Custom kwargs
   """
 
+  __slots__ = ("figure", "alt", "kwargs", "_rasters")
+
+  keys = ("global", "image")
+
   def __init__(self, figure: Any, alt: Optional[str] = None, style: Optional[dict] = None, properties: Optional[dict] = None, kwargs: Any = None) -> None:
     super().__init__(style, properties)
     if alt is None:
-      alt = str(hash(figure))
+      # Unlike the figure's hash, stable across processes
+      alt = ""
     if kwargs is None:
       kwargs = {}
     self.figure = figure
     self.alt = alt
     self.kwargs = kwargs
-    self.keys.extend(["image"])
-
-  def html(self, style) -> str:
+    self._rasters = {}
+
+  def _raster_key(self) -> str:
+    return repr(sorted(self.kwargs.items()))
+
+  @property
+  def rasterised(self) -> bool:
+    """
+    Whether the figure is cached for its current kwargs
+    """
+    return self._raster_key() in self._rasters
+
+  def store(self, image: bytes) -> None:
+    """
+    Caches the figure's PNG bytes for its current kwargs
+
+    :param image: The rasterised figure
+    """
+    self._rasters[self._raster_key()] = (image, digest(image))
+
+  def rasterise(self) -> tuple:
+    """
+    Rasterises the figure, unless it is already cached for its current kwargs
+
+    :return: The figure's PNG bytes and content ID
+    """
+    key = self._raster_key()
+    if key not in self._rasters:
+      self.store(fig_bytes(self.figure, **self.kwargs))
+    return self._rasters[key]
+
+  def invalidate(self) -> None:
+    """
+    Drops the cached rasters, after the figure has been changed
+    """
+    self._rasters.clear()
+    self.mark_dirty()
+
+  def html(self, style: dict, context: Optional[RenderContext] = None) -> str:
     _style = {**self.apply_style(style), **self.style}
-    _image = fig_bytes(self.figure, **self.kwargs)
-    _mime_image = MIMEImage(_image)
+    _image, _cid = self.rasterise()
 
-    if self.email:
-      self.email.attach(
+    if context is not None:
+      context.attach(
           item=_image,
-          mime=_mime_image,
           type="image",
           extension="png",
-          cid=str(hash(_image))
+          cid=_cid
       )
 
-    return f"<img src=\"cid:{str(hash(_image))}\" style=\"{parse_style(_style)}\" alt=\"{self.alt}\" />"
+    return f"<img src=\"cid:{_cid}\" style=\"{parse_style(_style)}\" alt=\"{self.alt}\" />"
 
-  def plain(self) -> str:
+  def plain(self, context: Optional[RenderContext] = None) -> str:
     return self.alt + "\n"
+
+
+def rasterise_figure(figure: Any, kwargs: dict) -> bytes:
+  """
+  Rasterises a matplotlib figure, in a worker thread or process
+
+  :param figure: The figure object
+  :param kwargs: Custom kwargs for `savefig`
+
+  :return: The figure's PNG bytes
+  """
+  return fig_bytes(figure, **kwargs)
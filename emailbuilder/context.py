@@ -0,0 +1,283 @@
+from .assets import asset_cache, map_file
+from .utils import digest
+
+from copy import deepcopy
+from email.message import EmailMessage
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+from typing import Any, Optional
+
+import os
+
+
+class Attachment(dict):
+  """
+  An attachment's descriptor, with the keys `content`, `cid`, `type`,
+  `extension`, `uuid` and `src`, and `asset` if its content was loaded
+  from `src` through the asset cache
+
+  Its MIME object (`mime`) is only built when it is used, e.g. when a
+  message is serialised, and a new one is built each time. The contents
+  of attachments added with `attach_file` are memory-mapped from `src`
+  whenever they are used, instead of being held in memory
+  """
+
+  def __missing__(self, key: str) -> Any:
+    if key == "content" and self.get("src") is not None:
+      return map_file(self["src"])
+    if key == "mime":
+      return self.build_mime()
+    raise KeyError(key)
+
+  def build_mime(self) -> Any:
+    """
+    Builds the attachment's MIME object
+
+    :return: The attachment as a MIME object
+    """
+    content = self["content"]
+    if self["type"] == "image":
+      try:
+        return MIMEImage(content)
+      except TypeError:
+        return MIMEImage(content, self["extension"])
+    return MIMEApplication(content)
+
+  def build_part(self) -> EmailMessage:
+    """
+    Builds the attachment's part of an EmailMessage object, as
+    `EmailMessage.add_attachment` would
+
+    :return: The attachment as an EmailMessage object
+    """
+    _part = EmailMessage()
+    _part.set_content(self["content"], self["type"], self["extension"],
+                      cid=f"<{self['cid']}>", filename=self["cid"])
+    if "Content-Disposition" not in _part:
+      _part["Content-Disposition"] = "attachment"
+    return _part
+
+  def build_mime_part(self) -> Any:
+    """
+    Builds the attachment's part of a MIMEMultipart object, copying
+    its MIME object if one was given
+
+    :return: The attachment as a MIME object, with its headers
+    """
+    if "mime" in self:
+      _part = deepcopy(self["mime"])
+    else:
+      _part = self.build_mime()
+    _part.add_header("Content-ID", f"<{self['cid']}>")
+    _part.add_header("Content-Disposition", "attachment", filename=self["cid"])
+    return _part
+
+  def __reduce__(self) -> tuple:
+    _attachment = dict(self)
+    if isinstance(_attachment.get("content"), memoryview):
+      _attachment["content"] = bytes(_attachment["content"])
+    return Attachment, (_attachment,)
+
+
+class Attachments:
+  """
+  Collects the attachments added while rendering an e-mail,
+  deduplicated by content digest and content ID
+  """
+
+  def __init__(self) -> None:
+    self.items = []
+    self._index = {}
+    self._recorders = []
+
+  def attach(self, item: Any, type: str, extension: str, cid: Optional[str] = None, mime: Optional[Any] = None, src: Optional[str] = None, asset: bool = False) -> dict:
+    """
+    Add attachment
+
+    :param item: Item to be attached, or None to memory-map `src`
+    :param type: Attachment's mime tipe
+    :param extension: Attachment's file extension
+    :param cid: Attachment's content id
+    :param mime:  Attachment as MIME object, built when needed by default
+    :param src: Attachment's source file
+    :param asset: Whether `item` was loaded from `src` through the asset
+                  cache, so it is revalidated when replayed
+
+    :return: The attachment
+    """
+    if item is None:
+      _uuid = digest(map_file(src))
+    else:
+      _uuid = digest(item)
+    if cid is None:
+      cid = _uuid
+    _attachment = self._index.get((_uuid, cid))
+
+    if _attachment is None:
+      _attachment = Attachment(
+          cid=cid,
+          type=type,
+          extension=extension,
+          uuid=_uuid,
+          src=src
+      )
+      if item is not None:
+        _attachment["content"] = item
+      if asset:
+        _attachment["asset"] = True
+      if mime is not None:
+        _attachment["mime"] = mime
+      self._index[(_uuid, cid)] = _attachment
+      self.items.append(_attachment)
+
+    for recorder in self._recorders:
+      recorder.append(_attachment)
+    return _attachment
+
+  def attach_file(self, path: str, type: str = "application", extension: Optional[str] = None, cid: Optional[str] = None) -> dict:
+    """
+    Add a file attachment, whose contents are memory-mapped when
+    the message is serialised instead of being held in memory
+
+    :param path: Path to the file
+    :param type: Attachment's mime tipe
+    :param extension: Attachment's file extension, defaults to the path's
+    :param cid: Attachment's content id
+
+    :return: The attachment
+    """
+    if extension is None:
+      extension = os.path.splitext(path)[1][1:].lower()
+    return self.attach(None, type, extension, cid, src=path)
+
+  def replay(self, attachments: list) -> None:
+    """
+    Re-add attachments recorded while rendering a component, when its
+    cached output is reused. Attachments loaded through the asset cache
+    are revalidated, others are re-added as they are
+
+    :param attachments: The recorded attachments
+    """
+    for attachment in attachments:
+      if attachment.get("asset"):
+        asset = asset_cache.get(attachment["src"])
+        if asset.content is not attachment["content"]:
+          attachment = Attachment(attachment, content=asset.content, uuid=digest(asset.content))
+          attachment.pop("mime", None)
+      key = (attachment["uuid"], attachment["cid"])
+      if key not in self._index:
+        self._index[key] = attachment
+        self.items.append(attachment)
+      for recorder in self._recorders:
+        recorder.append(attachment)
+
+  def record(self) -> list:
+    """
+    Starts recording the attachments being added
+
+    :return: The list the attachments are recorded into
+    """
+    recorded = []
+    self._recorders.append(recorded)
+    return recorded
+
+  def stop_recording(self) -> None:
+    """
+    Stops the most recently started recording
+    """
+    self._recorders.pop()
+
+
+class AttachmentRegistry:
+  """
+  Encoded attachment parts shared by every message of a batch, keyed by
+  content digest, so each attachment is only encoded once per batch
+
+  The parts are shared, not copied, so they must not be modified
+  """
+
+  def __init__(self) -> None:
+    self.hits = 0
+    self.misses = 0
+    self._parts = {}
+
+  def _get(self, kind: str, attachment: Attachment, build: Any) -> Any:
+    key = (kind, attachment["uuid"], attachment["cid"], attachment["type"], attachment["extension"])
+    _part = self._parts.get(key)
+    if _part is None:
+      self.misses += 1
+      _part = self._parts.setdefault(key, build())
+    else:
+      self.hits += 1
+    return _part
+
+  def part(self, attachment: Attachment) -> EmailMessage:
+    """
+    Gets an attachment's shared EmailMessage part, see `Attachment.build_part`
+
+    :param attachment: The attachment
+
+    :return: The encoded part
+    """
+    return self._get("part", attachment, attachment.build_part)
+
+  def mime_part(self, attachment: Attachment) -> Any:
+    """
+    Gets an attachment's shared MIME part, see `Attachment.build_mime_part`
+
+    :param attachment: The attachment
+
+    :return: The encoded part
+    """
+    return self._get("mime", attachment, attachment.build_mime_part)
+
+  def clear(self) -> None:
+    """
+    Drops the shared parts
+    """
+    self._parts.clear()
+
+  def __len__(self) -> int:
+    return len(self._parts)
+
+
+class RenderContext:
+  """
+  The state of a single render, passed down the component tree instead
+  of being stored on the components, so that one tree can be rendered
+  by many threads at once
+
+  :param attachments: Collects the render's attachments
+  :param indent: Plain-text indentation
+  :param order_prefix: Plain-text ordered list prefix
+  :param compact: Leave out the HTML templates' whitespace
+  :param cache: Cache the components' output, or only reuse what is
+                already cached
+  """
+
+  def __init__(self, attachments: Optional[Attachments] = None, indent: str = "", order_prefix: str = "", compact: bool = False, cache: bool = False) -> None:
+    self.attachments = attachments
+    self.indent = indent
+    self.order_prefix = order_prefix
+    self.compact = compact
+    self.cache = cache
+
+  def child(self, indent: Optional[str] = None, order_prefix: str = "") -> "RenderContext":
+    """
+    Gets the context a child component is rendered with
+
+    :param indent: The child's plain-text indentation, defaults to the current one
+    :param order_prefix: The child's plain-text ordered list prefix
+
+    :return: The child's context
+    """
+    if indent is None:
+      indent = self.indent
+    return RenderContext(self.attachments, indent, order_prefix, self.compact, self.cache)
+
+  def attach(self, *args, **kwargs) -> None:
+    """
+    Add attachment, if the render collects them (see `Attachments.attach`)
+    """
+    if self.attachments is not None:
+      self.attachments.attach(*args, **kwargs)
@@ -0,0 +1,442 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.message import Message
+from email.parser import BytesHeaderParser, BytesParser, HeaderParser, Parser
+from email.policy import default as default_policy
+from email.utils import getaddresses
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import asyncio
+import collections
+import functools
+import queue
+import smtplib
+import ssl
+import threading
+
+
+def connect(
+    host: str = "localhost",
+    port: int = 0,
+    implicit_tls: bool = False,
+    starttls: bool = False,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    timeout: float = 30.0,
+    context: Optional[ssl.SSLContext] = None
+  ) -> smtplib.SMTP:
+  """
+  Opens an SMTP connection
+
+  :param host: The SMTP server's host
+  :param port: The SMTP server's port, defaults to the protocol's
+  :param implicit_tls: Connect over TLS (SMTPS)
+  :param starttls: Upgrade the connection to TLS with STARTTLS
+  :param username: Login username
+  :param password: Login password
+  :param timeout: Socket timeout, in seconds
+  :param context: TLS context, defaults to one that verifies certificates
+
+  :return: The connection
+  """
+  if (implicit_tls or starttls) and context is None:
+    context = ssl.create_default_context()
+  if implicit_tls:
+    smtp = smtplib.SMTP_SSL(host, port, timeout=timeout, context=context)
+  else:
+    smtp = smtplib.SMTP(host, port, timeout=timeout)
+    if starttls:
+      smtp.starttls(context=context)
+  if username is not None:
+    smtp.login(username, password)
+  return smtp
+
+
+def prepare(message: Any) -> Message | bytes | str:
+  """
+  Gets a message that can be sent, rendering e-mails
+
+  :param message: An EMail object, a Message object or a serialised message
+
+  :return: The message
+  """
+  if isinstance(message, (Message, bytes, str)):
+    return message
+  return message.message()
+
+
+def _recipients(headers: Message) -> list:
+  """
+  Gets a message's envelope recipients from its headers, leaving out
+  empty addresses
+  """
+  _headers = headers.get_all("To", []) + headers.get_all("Cc", []) + headers.get_all("Bcc", [])
+  return [address for _, address in getaddresses([str(header) for header in _headers]) if address]
+
+
+def deliver(smtp: Any, message: Message | bytes | str, sender: Optional[str] = None, recipients: Optional[list] = None) -> dict:
+  """
+  Sends a message over an open SMTP connection
+
+  The envelope is taken from the message's headers, unless given,
+  leaving out empty addresses. Serialised messages with a `Bcc` header
+  are parsed, so that the header isn't sent
+
+  :param smtp: The SMTP connection
+  :param message: A Message object or a serialised message
+  :param sender: Envelope sender
+  :param recipients: Envelope recipients
+
+  :return: The refused recipients, see `smtplib.SMTP.sendmail`
+  """
+  if isinstance(message, (bytes, str)):
+    if isinstance(message, bytes):
+      headers = BytesHeaderParser(policy=default_policy).parsebytes(message)
+    else:
+      headers = HeaderParser(policy=default_policy).parsestr(message)
+    if headers["Bcc"] is not None:
+      if isinstance(message, bytes):
+        message = BytesParser(policy=default_policy).parsebytes(message)
+      else:
+        message = Parser(policy=default_policy).parsestr(message)
+    else:
+      if sender is None:
+        sender = getaddresses([headers["Sender"] or headers["From"]])[0][1]
+      if recipients is None:
+        recipients = _recipients(headers)
+      return smtp.sendmail(sender, recipients, message)
+  if recipients is None and message["Resent-Date"] is None:
+    recipients = _recipients(message)
+  return smtp.send_message(message, sender, recipients)
+
+
+class SMTPConnection:
+  """
+  A persistent SMTP connection, which is opened when first used and
+  reopened after `max_messages` messages or when it fails
+
+  :param factory: Function opening an SMTP connection
+  :param max_messages: Number of messages sent over a connection before it is reopened
+  :param retries: Number of times a message is resent over a new
+                  connection, after the connection fails. A connection
+                  lost after the message's data was sent, but before
+                  the server acknowledged it, may deliver it twice
+  """
+
+  def __init__(self, factory: Callable, max_messages: int = 100, retries: int = 1) -> None:
+    self.factory = factory
+    self.max_messages = max_messages
+    self.retries = retries
+    self.sent = 0
+    self.connects = 0
+    self._smtp = None
+
+  def send(self, message: Message | bytes | str, sender: Optional[str] = None, recipients: Optional[list] = None) -> dict:
+    """
+    Sends a message, reconnecting if needed
+
+    :param message: A Message object or a serialised message
+    :param sender: Envelope sender
+    :param recipients: Envelope recipients
+
+    :return: The refused recipients
+    """
+    attempt = 0
+    while True:
+      if self._smtp is None:
+        self._smtp = self.factory()
+        self.connects += 1
+        self.sent = 0
+      try:
+        refused = deliver(self._smtp, message, sender, recipients)
+      except OSError as error:
+        # Errors reported by the server don't warrant a new connection.
+        # smtplib doesn't tell whether the DATA command completed, so a
+        # message retried after a late failure may be delivered twice
+        if isinstance(error, smtplib.SMTPException) and not isinstance(error, smtplib.SMTPServerDisconnected):
+          raise
+        self.close()
+        attempt += 1
+        if attempt > self.retries:
+          raise
+        continue
+      self.sent += 1
+      if self.sent >= self.max_messages:
+        self.close()
+      return refused
+
+  def close(self) -> None:
+    """
+    Closes the connection, if it is open
+    """
+    if self._smtp is not None:
+      smtp, self._smtp = self._smtp, None
+      try:
+        smtp.quit()
+      except OSError:
+        smtp.close()
+
+
+class SMTPPool:
+  """
+  Sends messages over a bounded pool of persistent SMTP connections,
+  each used by its own worker thread
+
+  E-mails are rendered by the workers, while other messages are being
+  sent. Submitting blocks while `queue_size` messages are waiting, so
+  a large campaign is never held in memory at once
+
+  ```python
+  with eb.SMTPPool("smtp.example.com", 587, starttls=True, username=user, password=password) as pool:
+    for future in pool.send_many(emails):
+      if future.exception() is not None:
+        print(future.exception())
+  ```
+
+  :param host: The SMTP server's host
+  :param port: The SMTP server's port
+  :param size: Number of connections
+  :param max_messages: Number of messages sent over a connection before it is reopened
+  :param queue_size: Number of messages waiting to be sent, defaults to twice `size`
+  :param retries: Number of times a message is resent after its connection fails
+  :param factory: Function opening an SMTP connection, defaults to `connect`
+                  with this pool's arguments, e.g. to use a local stand-in
+  :param kwargs: Arguments for `connect`
+  """
+
+  def __init__(
+      self,
+      host: str = "localhost",
+      port: int = 0,
+      size: int = 4,
+      max_messages: int = 100,
+      queue_size: Optional[int] = None,
+      retries: int = 1,
+      factory: Optional[Callable] = None,
+      **kwargs: Any
+    ) -> None:
+    if factory is None:
+      factory = functools.partial(connect, host, port, **kwargs)
+    if queue_size is None:
+      queue_size = size * 2
+    self.factory = factory
+    self.size = size
+    self.max_messages = max_messages
+    self.retries = retries
+    self._queue = queue.Queue(maxsize=queue_size)
+    self._closed = False
+    self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(size)]
+    for worker in self._workers:
+      worker.start()
+
+  def _work(self) -> None:
+    connection = SMTPConnection(self.factory, self.max_messages, self.retries)
+    try:
+      while True:
+        job = self._queue.get()
+        if job is None:
+          return
+        future, message, sender, recipients = job
+        if not future.set_running_or_notify_cancel():
+          continue
+        try:
+          refused = connection.send(prepare(message), sender, recipients)
+        except BaseException as error:
+          future.set_exception(error)
+        else:
+          future.set_result(refused)
+    finally:
+      connection.close()
+
+  def submit(self, message: Any, sender: Optional[str] = None, recipients: Optional[list] = None) -> Future:
+    """
+    Queues a message, waiting while the queue is full
+
+    :param message: An EMail object, a Message object or a serialised message
+    :param sender: Envelope sender
+    :param recipients: Envelope recipients
+
+    :return: A future of the refused recipients
+    """
+    if self._closed:
+      raise RuntimeError("The pool is closed")
+    future = Future()
+    self._queue.put((future, message, sender, recipients))
+    return future
+
+  def send(self, message: Any, sender: Optional[str] = None, recipients: Optional[list] = None) -> dict:
+    """
+    Sends a message, waiting until it is sent
+
+    :param message: An EMail object, a Message object or a serialised message
+    :param sender: Envelope sender
+    :param recipients: Envelope recipients
+
+    :return: The refused recipients
+    """
+    return self.submit(message, sender, recipients).result()
+
+  def send_many(self, messages: Iterable[Any]) -> Iterator[Future]:
+    """
+    Sends many messages, consuming them lazily
+
+    :param messages: EMail objects, Message objects or serialised messages
+
+    :return: An iterator over the messages' completed futures, in order
+    """
+    futures = collections.deque()
+    for message in messages:
+      futures.append(self.submit(message))
+      while futures and futures[0].done():
+        yield futures.popleft()
+    while futures:
+      futures[0].exception()
+      yield futures.popleft()
+
+  def close(self) -> None:
+    """
+    Sends the queued messages, then closes the connections
+    """
+    if self._closed:
+      return
+    self._closed = True
+    for _ in self._workers:
+      self._queue.put(None)
+    for worker in self._workers:
+      worker.join()
+
+  def __enter__(self) -> "SMTPPool":
+    return self
+
+  def __exit__(self, *exc: Any) -> None:
+    self.close()
+
+
+class AsyncSMTPPool:
+  """
+  Sends messages over a bounded pool of persistent SMTP connections,
+  from asyncio code
+
+  Each connection is driven by a worker task, which renders and sends
+  its messages in a thread, so the event loop is never blocked
+
+  ```python
+  async with eb.AsyncSMTPPool("smtp.example.com", 465, implicit_tls=True) as pool:
+    await pool.send(email)
+  ```
+
+  :param host: The SMTP server's host
+  :param port: The SMTP server's port
+  :param size: Number of connections
+  :param max_messages: Number of messages sent over a connection before it is reopened
+  :param queue_size: Number of messages waiting to be sent, defaults to twice `size`
+  :param retries: Number of times a message is resent after its connection fails
+  :param factory: Function opening an SMTP connection, defaults to `connect`
+                  with this pool's arguments, e.g. to use a local stand-in
+  :param kwargs: Arguments for `connect`
+  """
+
+  def __init__(
+      self,
+      host: str = "localhost",
+      port: int = 0,
+      size: int = 4,
+      max_messages: int = 100,
+      queue_size: Optional[int] = None,
+      retries: int = 1,
+      factory: Optional[Callable] = None,
+      **kwargs: Any
+    ) -> None:
+    if factory is None:
+      factory = functools.partial(connect, host, port, **kwargs)
+    if queue_size is None:
+      queue_size = size * 2
+    self.factory = factory
+    self.size = size
+    self.max_messages = max_messages
+    self.retries = retries
+    self.queue_size = queue_size
+    self._queue = None
+    self._workers = []
+    self._executor = None
+
+  def start(self) -> None:
+    """
+    Starts the worker tasks, in the running event loop
+    """
+    if self._queue is not None:
+      return
+    self._queue = asyncio.Queue(maxsize=self.queue_size)
+    self._executor = ThreadPoolExecutor(max_workers=self.size)
+    self._workers = [asyncio.create_task(self._work()) for _ in range(self.size)]
+
+  async def _work(self) -> None:
+    loop = asyncio.get_running_loop()
+    connection = SMTPConnection(self.factory, self.max_messages, self.retries)
+    try:
+      while True:
+        job = await self._queue.get()
+        if job is None:
+          return
+        future, message, sender, recipients = job
+        if future.cancelled():
+          continue
+        try:
+          refused = await loop.run_in_executor(
+              self._executor,
+              lambda: connection.send(prepare(message), sender, recipients)
+          )
+        except Exception as error:
+          if not future.cancelled():
+            future.set_exception(error)
+        else:
+          if not future.cancelled():
+            future.set_result(refused)
+    finally:
+      await loop.run_in_executor(self._executor, connection.close)
+
+  async def submit(self, message: Any, sender: Optional[str] = None, recipients: Optional[list] = None) -> asyncio.Future:
+    """
+    Queues a message, waiting while the queue is full
+
+    :param message: An EMail object, a Message object or a serialised message
+    :param sender: Envelope sender
+    :param recipients: Envelope recipients
+
+    :return: A future of the refused recipients
+    """
+    self.start()
+    future = asyncio.get_running_loop().create_future()
+    await self._queue.put((future, message, sender, recipients))
+    return future
+
+  async def send(self, message: Any, sender: Optional[str] = None, recipients: Optional[list] = None) -> dict:
+    """
+    Sends a message, waiting until it is sent
+
+    :param message: An EMail object, a Message object or a serialised message
+    :param sender: Envelope sender
+    :param recipients: Envelope recipients
+
+    :return: The refused recipients
+    """
+    return await (await self.submit(message, sender, recipients))
+
+  async def close(self) -> None:
+    """
+    Sends the queued messages, then closes the connections
+    """
+    if self._queue is None:
+      return
+    for _ in self._workers:
+      await self._queue.put(None)
+    await asyncio.gather(*self._workers)
+    self._executor.shutdown()
+    self._queue = None
+    self._workers = []
+
+  async def __aenter__(self) -> "AsyncSMTPPool":
+    self.start()
+    return self
+
+  async def __aexit__(self, *exc: Any) -> None:
+    await self.close()
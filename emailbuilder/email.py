@@ -1,17 +1,29 @@
-from .components import Element
-from .utils import const, parse_style, parse_text, TagStripper
+from .components import Element, Container, Figure, rasterise_figure
+from .context import AttachmentRegistry, Attachments, RenderContext
+from .utils import const, extract_styles, inherit_style, parse_style, parse_text, StyleChain
 
-from email.mime.application import MIMEApplication
 from email.message import EmailMessage
-from email.utils import make_msgid
+from concurrent.futures import Executor, ThreadPoolExecutor
 
-from copy import deepcopy
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
 
 import os
 import tempfile
 
 
+class RenderedEMail(NamedTuple):
+  """
+  The result of rendering an e-mail with `EMail.render`
+
+  :param html: The e-mail's body as HTML
+  :param plain: The e-mail's content as plain-text
+  :param attachments: The attachments collected while rendering
+  """
+  html: str
+  plain: str
+  attachments: list
+
+
 class EMail:
   def __init__(
       self, 
@@ -69,7 +81,13 @@ class EMail:
     self.blind_copy = blind_copy
     self.items = []
     self.style = {**default_style, **style}
-    self.attachments = []
+    self._added = Attachments()
+    self._attachments = self._added
+    self.attachments = self._attachments.items
+    self.figure_executor = None
+    self.compact = False
+    self.hoist_styles = False
+    self.cache = False
 
   def attach(self, item: Any, type: str, extension: str, cid: Optional[str] = None, mime: Optional[Any] = None, src: Optional[str] = None) -> None:
     """
@@ -81,26 +99,19 @@ class EMail:
     :param cid: Attachment's content id
     :param mime:  Attachment as MIME object
     """
-    _uuid = str(hash(item))
-    if cid is None:
-      cid = make_msgid()[1:-1]
-    for attachment in self.attachments:
-      if attachment["uuid"] == _uuid:
-        return
-
-    if mime is None:
-      mime = MIMEApplication(item)
-
-    _attachment = {
-        "content": item,
-        "mime": mime,
-        "cid": cid,
-        "type": type,
-        "extension": extension,
-        "uuid": _uuid,
-        "src": src
-    }
-    self.attachments.append(_attachment)
+    self._added.attach(item, type, extension, cid, mime, src)
+
+  def attach_file(self, path: str, type: str = "application", extension: Optional[str] = None, cid: Optional[str] = None) -> None:
+    """
+    Add a file attachment, which is memory-mapped when the message
+    is serialised instead of being held in memory
+
+    :param path: Path to the file
+    :param type: Attachment's mime tipe
+    :param extension: Attachment's file extension, defaults to the path's
+    :param cid: Attachment's content id
+    """
+    self._added.attach_file(path, type, extension, cid)
 
   def append(self, item: Element) -> None:
     """
@@ -110,39 +121,166 @@ class EMail:
     """
     self.items.append(item)
 
-  def html(self) -> str:
+  def walk(self) -> Iterator[Element]:
     """
-    Get the e-mail's body as HTML
+    Iterate over every component in the e-mail, depth-first
 
-    :return: String containing e-mail's body as HTML
+    :return: An iterator over the components
     """
-    self.attachments = []
-    html = ""
-    for item in self.items:
+    stack = list(reversed(self.items))
+    while stack:
+      item = stack.pop()
       if issubclass(type(item), Element):
-        item.email = self
-        html += item.html(deepcopy(self.style))
-      else:
-        html += f"{parse_text(str(item))}<br/>"
+        yield item
+      if issubclass(type(item), Container):
+        stack.extend(reversed(item.children))
+
+  def rasterise_figures(self, executor: Optional[Executor] = None) -> None:
+    """
+    Rasterise the e-mail's figures concurrently, ahead of rendering it
+
+    Figures that are already cached are skipped. This runs automatically
+    before each render when `figure_executor` is set
+
+    :param executor: Thread or process pool to use, defaults to a new thread pool
+    """
+    figures = [
+        item for item in self.walk()
+        if issubclass(type(item), Figure) and not item.rasterised
+    ]
+    if len(figures) == 0:
+      return
+    if executor is None:
+      with ThreadPoolExecutor() as pool:
+        return self.rasterise_figures(pool)
+    images = executor.map(
+        rasterise_figure,
+        [figure.figure for figure in figures],
+        [figure.kwargs for figure in figures]
+    )
+    for figure, image in zip(figures, images):
+      figure.store(image)
+
+  def iter_html(self, attachments: Optional[Attachments] = None, compact: Optional[bool] = None, cache: Optional[bool] = None) -> Iterator[str]:
+    """
+    Get the e-mail's body as HTML, in chunks
+
+    :param attachments: Collects the attachments added while rendering
+    :param compact: Leave out the templates' whitespace, defaults to `compact`
+    :param cache: Cache the components' output, defaults to `cache`
+
+    :return: An iterator over the HTML chunks
+    """
+    if compact is None:
+      compact = self.compact
+    if cache is None:
+      cache = self.cache
+    if self.figure_executor is not None:
+      self.rasterise_figures(self.figure_executor)
+    if attachments is None:
+      attachments = Attachments()
+    context = RenderContext(attachments, compact=compact, cache=cache)
+    style = StyleChain(self.style)
     root_style = parse_style(self.style["root"])
     body_style = parse_style(self.style["body"])
-    return f"""
+    if compact:
+      yield f"<body style=\"{root_style}\"><table border=\"0\" cellspacing=\"0\" cellpadding=\"0\" style=\"{body_style}\">"
+    else:
+      yield f"""
     <body style=\"{root_style}\">
       <table border=\"0\" cellspacing=\"0\" cellpadding=\"0\" style=\"{body_style}\">
-        {html}
+        """
+    for item in self.items:
+      if issubclass(type(item), Element):
+        # Containers write the attributes they pass down into the
+        # global rules, so each item inherits its own copy of them
+        _style = style
+        if "global" in self.style:
+          _style = inherit_style(style, {"global": dict(self.style["global"])})
+        yield from item.iter_cached_html(_style, context)
+      else:
+        yield f"{parse_text(str(item))}<br/>"
+    if compact:
+      yield "</table></body>"
+    else:
+      yield """
       </table>
     </body>
     """
+    attachments.replay(self._added.items)
+    self._attachments = attachments
+    self.attachments = attachments.items
+
+  def html(self, compact: Optional[bool] = None, hoist_styles: Optional[bool] = None) -> str:
+    """
+    Get the e-mail's body as HTML
+
+    :param compact: Leave out the templates' whitespace, defaults to `compact`
+    :param hoist_styles: Move repeated inline styles into a `<style>`
+                         block, defaults to `hoist_styles`
+
+    :return: String containing e-mail's body as HTML
+    """
+    if hoist_styles is None:
+      hoist_styles = self.hoist_styles
+    html = "".join(self.iter_html(compact=compact))
+    if hoist_styles:
+      html = extract_styles(html)
+    return html
+
+  def write_html(self, fp: Any, cache: bool = False) -> None:
+    """
+    Write the e-mail's body as HTML to a text file-like object,
+    without building the whole body in memory
+
+    Styles are never hoisted, as that needs the whole body. Output
+    that is already cached is reused, but nothing new is cached unless
+    `cache` is set
+
+    :param fp: Text file-like object to write to
+    :param cache: Cache the components' output
+    """
+    for chunk in self.iter_html(cache=cache):
+      fp.write(chunk)
 
   def plain(self) -> str:
     """
-    Get the e-mail's content as plain-text (W.I.P.)
+    Get the e-mail's content as plain-text
 
     :return: String containing e-mail's content
     """
-    s = TagStripper()
-    s.feed(self.html())
-    return s.get_data()
+    out = []
+    self.write_plain(out)
+    return "".join(out)
+
+  def write_plain(self, out: list) -> None:
+    """
+    Writes the e-mail's content as plain-text into a buffer
+
+    :param out: The buffer, a list of strings
+    """
+    context = RenderContext(cache=self.cache)
+    for item in self.items:
+      if issubclass(type(item), Element):
+        item.write_cached_plain(out, context)
+      else:
+        out.append(f"{str(item)}\n")
+
+  def render(self) -> RenderedEMail:
+    """
+    Render the e-mail's HTML, plain-text and attachments together
+
+    The HTML and the plain text are two walks over the components, but
+    only the HTML walk loads, encodes and rasterises images and figures,
+    whose plain text is their alternative text
+
+    :return: The rendered e-mail
+    """
+    attachments = Attachments()
+    html = "".join(self.iter_html(attachments))
+    if self.hoist_styles:
+      html = extract_styles(html)
+    return RenderedEMail(html, self.plain(), attachments.items)
 
   def to_outlook(self) -> Any:
     """
@@ -156,6 +294,7 @@ class EMail:
       w32 = None
 
     if w32:
+      rendered = self.render()
       o = w32.Dispatch("Outlook.Application")
       email = o.CreateItem(0)
       if self.receiver is not None:
@@ -166,9 +305,9 @@ class EMail:
           email.BCC = self.blind_copy
       if self.subject is not None:
           email.Subject = self.subject
-      email.Body = self.plain()
-      email.HTMLBody = self.html()
-      for att in self.attachments:
+      email.Body = rendered.plain
+      email.HTMLBody = rendered.html
+      for att in rendered.attachments:
         if att['src'] is None:
           fd, path = tempfile.mkstemp(suffix="." + att['extension'])
           try:
@@ -192,21 +331,84 @@ class EMail:
     else:
       return None
 
-  def message(self) -> EmailMessage:
+  def message(self, registry: Optional[AttachmentRegistry] = None) -> EmailMessage:
     """
     Get the e-mail as an EmailMessage object
 
+    :param registry: Shares encoded attachments with other messages
+
     :return: The e-mail as an EmailMessage object
     """
-    _msg = EmailMessage()
-    _msg["Subject"] = self.subject
-    _msg["From"] = self.sender
-    _msg["To"] = self.receiver
-    _msg["CC"] = self.copy
-    _msg["BCC"] = self.blind_copy
-    _msg.set_content(self.plain())
-    _msg.add_alternative(self.html(), subtype="html")
-    for att in self.attachments:
-      _msg.add_attachment(att["content"], att["type"],
-                          att["extension"], cid=f"<{att['cid']}>", filename=att["cid"])
+    return build_message(
+        self.render(),
+        self.subject,
+        self.sender,
+        self.receiver,
+        self.copy,
+        self.blind_copy,
+        registry
+    )
+
+  def render_many(self, contexts: Iterable[dict], workers: Optional[int] = None, chunksize: int = 256, as_bytes: bool = False) -> Iterator[EmailMessage | bytes]:
+    """
+    Get the e-mail as an EmailMessage object for each recipient context
+
+    :param contexts: Slot values for each recipient
+    :param workers: Number of worker processes, or None to render in this process
+    :param chunksize: Number of contexts sent to a worker at a time
+    :param as_bytes: Yield the serialised messages instead
+
+    :return: An iterator over the EmailMessage objects, in order
+    """
+    from .batch import render_many
+    return render_many(self, contexts, workers=workers, chunksize=chunksize, as_bytes=as_bytes)
+
+  def compile(self) -> Any:
+    """
+    Compile the e-mail into a template, whose named slots
+    (e.g. "Hi {name}") are filled in per recipient
+
+    :return: The compiled e-mail, as a Template object
+    """
+    from .template import Template
+    return Template(self)
+
+
+def build_message(
+    rendered: RenderedEMail,
+    subject: str = "",
+    sender: str = "",
+    receiver: Optional[str | list] = None,
+    copy: Optional[str | list] = None,
+    blind_copy: Optional[str | list] = None,
+    registry: Optional[AttachmentRegistry] = None
+  ) -> EmailMessage:
+  """
+  Build an EmailMessage object from a rendered e-mail
+
+  :param rendered: The rendered e-mail
+  :param subject: E-Mail subject
+  :param sender: Sender's address
+  :param receiver: Receiver(s)'s address(es)
+  :param registry: Shares encoded attachments with other messages,
+                   instead of encoding them again
+
+  :return: The e-mail as an EmailMessage object
+  """
+  _msg = EmailMessage()
+  _msg["Subject"] = subject
+  _msg["From"] = sender
+  for header, value in (("To", receiver), ("CC", copy), ("BCC", blind_copy)):
+    if value is not None:
+      _msg[header] = value
+  _msg.set_content(rendered.plain)
+  _msg.add_alternative(rendered.html, subtype="html")
+  if registry is not None and rendered.attachments:
+    _msg.make_mixed()
+    for att in rendered.attachments:
+      _msg.attach(registry.part(att))
     return _msg
+  for att in rendered.attachments:
+    _msg.add_attachment(att["content"], att["type"],
+                        att["extension"], cid=f"<{att['cid']}>", filename=att["cid"])
+  return _msg
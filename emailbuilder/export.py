@@ -0,0 +1,234 @@
+from .batch import chunked, render_many
+from .context import AttachmentRegistry
+from .delivery import prepare
+from .email import EMail
+from .template import Template
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email.generator import BytesGenerator
+from email.message import Message
+from email.parser import BytesHeaderParser, HeaderParser
+from email.utils import getaddresses
+from typing import Any, BinaryIO, Iterable, Optional
+
+import itertools
+import os
+import re
+import socket
+import time
+
+_from_line = re.compile(rb"^From ", re.MULTILINE)
+_maildir_count = itertools.count()
+_worker_template = None
+_worker_registry = None
+
+
+def write_message(message: Any, fp: BinaryIO, mbox: bool = False) -> None:
+  """
+  Serialises a message straight into a binary file-like object
+
+  :param message: An EMail object, a Message object or a serialised message
+  :param fp: The file-like object
+  :param mbox: Use mbox line endings and escape lines starting with "From "
+  """
+  message = prepare(message)
+  if isinstance(message, Message):
+    policy = message.policy.clone(linesep="\n") if mbox else message.policy
+    BytesGenerator(fp, mangle_from_=mbox, policy=policy).flatten(message)
+    return
+  if isinstance(message, str):
+    message = message.encode()
+  if mbox:
+    message = _from_line.sub(b">From ", message.replace(b"\r\n", b"\n"))
+  fp.write(message)
+
+
+class _Tail:
+  """
+  Writes into a file-like object, remembering the last byte written
+  """
+
+  def __init__(self, fp: BinaryIO) -> None:
+    self.fp = fp
+    self.last = b""
+
+  def write(self, data: bytes) -> None:
+    if data:
+      self.last = data[-1:]
+      self.fp.write(data)
+
+
+def _from_address(message: Message | bytes | str) -> str:
+  if isinstance(message, bytes):
+    message = BytesHeaderParser().parsebytes(message)
+  elif isinstance(message, str):
+    message = HeaderParser().parsestr(message)
+  _sender = message["Sender"] or message["From"]
+  if _sender:
+    _address = getaddresses([str(_sender)])[0][1]
+    if _address:
+      return _address
+  return "MAILER-DAEMON"
+
+
+def write_eml(messages: Iterable[Any], directory: str, pattern: str = "{index:06d}.eml", start: int = 0, buffering: int = 65536) -> int:
+  """
+  Writes each message to its own .eml file
+
+  :param messages: EMail objects, Message objects or serialised messages
+  :param directory: Directory of the files, created if needed
+  :param pattern: File name pattern, formatted with the message's index
+  :param start: Index of the first message
+  :param buffering: Write buffer size, in bytes
+
+  :return: The number of messages written
+  """
+  os.makedirs(directory, exist_ok=True)
+  _count = 0
+  for index, message in enumerate(messages, start):
+    with open(os.path.join(directory, pattern.format(index=index)), "wb", buffering=buffering) as fp:
+      write_message(message, fp)
+    _count += 1
+  return _count
+
+
+def write_mbox(messages: Iterable[Any], path: str, buffering: int = 65536) -> int:
+  """
+  Appends messages to an mbox file
+
+  :param messages: EMail objects, Message objects or serialised messages
+  :param path: The mbox file, created if needed
+  :param buffering: Write buffer size, in bytes
+
+  :return: The number of messages written
+  """
+  _count = 0
+  with open(path, "ab", buffering=buffering) as fp:
+    for message in messages:
+      message = prepare(message)
+      fp.write(f"From {_from_address(message)} {time.asctime(time.gmtime())}\n".encode())
+      _tail = _Tail(fp)
+      write_message(message, _tail, mbox=True)
+      fp.write(b"\n" if _tail.last == b"\n" else b"\n\n")
+      _count += 1
+  return _count
+
+
+def write_maildir(messages: Iterable[Any], directory: str, buffering: int = 65536) -> int:
+  """
+  Delivers messages into a Maildir, writing each to `tmp`
+  then moving it to `new`
+
+  :param messages: EMail objects, Message objects or serialised messages
+  :param directory: The Maildir, created if needed
+  :param buffering: Write buffer size, in bytes
+
+  :return: The number of messages written
+  """
+  for folder in ("tmp", "new", "cur"):
+    os.makedirs(os.path.join(directory, folder), exist_ok=True)
+  _host = socket.gethostname().replace("/", r"\057").replace(":", r"\072")
+  _count = 0
+  for message in messages:
+    _now = time.time()
+    _name = f"{int(_now)}.M{int(_now % 1 * 1e6)}P{os.getpid()}Q{next(_maildir_count)}.{_host}"
+    _tmp = os.path.join(directory, "tmp", _name)
+    with open(_tmp, "wb", buffering=buffering) as fp:
+      write_message(message, fp)
+    os.rename(_tmp, os.path.join(directory, "new", _name))
+    _count += 1
+  return _count
+
+
+def _init_worker(template: Template) -> None:
+  global _worker_template, _worker_registry
+  _worker_template = template
+  _worker_registry = AttachmentRegistry()
+
+
+def _export(
+    template: Template,
+    registry: AttachmentRegistry,
+    format: str,
+    path: str,
+    start: int,
+    contexts: Iterable[dict],
+    buffering: int
+  ) -> int:
+  messages = (template.message(context, registry) for context in contexts)
+  if format == "eml":
+    return write_eml(messages, path, start=start, buffering=buffering)
+  return write_maildir(messages, path, buffering=buffering)
+
+
+def _export_chunk(format: str, path: str, start: int, contexts: list, buffering: int) -> int:
+  return _export(_worker_template, _worker_registry, format, path, start, contexts, buffering)
+
+
+def export_many(
+    email: EMail | Template,
+    contexts: Iterable[dict],
+    path: str,
+    format: str = "eml",
+    workers: Optional[int] = None,
+    chunksize: int = 256,
+    prefetch: int = 2,
+    buffering: int = 65536
+  ) -> int:
+  """
+  Renders an e-mail for each recipient context and writes the
+  messages to disk, as .eml files, an mbox or a Maildir
+
+  Contexts are consumed lazily and each message is streamed to its
+  file as soon as it is built. With `workers`, .eml files and Maildir
+  messages are rendered and written by the worker processes, while
+  mbox messages are serialised by the workers and appended in order
+
+  :param email: The e-mail, or a compiled template of it
+  :param contexts: Slot values for each recipient
+  :param path: The .eml files' directory, the mbox file or the Maildir
+  :param format: "eml", "mbox" or "maildir"
+  :param workers: Number of worker processes, or None to write from this process
+  :param chunksize: Number of contexts sent to a worker at a time
+  :param prefetch: Number of chunks queued per worker
+  :param buffering: Write buffer size, in bytes
+
+  :return: The number of messages written
+  """
+  if format not in ("eml", "mbox", "maildir"):
+    raise ValueError(f"Unknown export format: {format}")
+  template = email.compile() if isinstance(email, EMail) else email
+
+  if format == "mbox":
+    return write_mbox(
+        render_many(template, contexts, workers, chunksize, prefetch, as_bytes=bool(workers)),
+        path,
+        buffering=buffering
+    )
+  if not workers:
+    return _export(template, AttachmentRegistry(), format, path, 0, contexts, buffering)
+
+  if format == "maildir":
+    for folder in ("tmp", "new", "cur"):
+      os.makedirs(os.path.join(path, folder), exist_ok=True)
+  else:
+    os.makedirs(path, exist_ok=True)
+
+  pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(template,))
+  pending = deque()
+  _count = 0
+  try:
+    _start = 0
+    for chunk in chunked(contexts, chunksize):
+      pending.append(pool.submit(_export_chunk, format, path, _start, chunk, buffering))
+      _start += len(chunk)
+      if len(pending) >= workers * prefetch:
+        _count += pending.popleft().result()
+    while pending:
+      _count += pending.popleft().result()
+  finally:
+    for future in pending:
+      future.cancel()
+    pool.shutdown()
+  return _count
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from typing import Any, Optional
+
+import threading
+
+
+class FragmentCache:
+  """
+  Process-wide cache of rendered fragments, shared between e-mails
+
+  Entries are keyed by the fragment's structural fingerprint and the
+  style it inherits, and the least recently used entries are evicted
+  once the cache holds more than `max_entries`
+
+  :param max_entries: The maximum number of cached renders
+  """
+
+  def __init__(self, max_entries: int = 256) -> None:
+    self.max_entries = max_entries
+    self.hits = 0
+    self.misses = 0
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key: Any) -> Optional[Any]:
+    """
+    Gets a cached render
+
+    :param key: The render's key
+
+    :return: The cached render, or None
+    """
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry
+
+  def put(self, key: Any, entry: Any) -> None:
+    """
+    Caches a render
+
+    :param key: The render's key
+    :param entry: The render
+    """
+    with self._lock:
+      self._entries[key] = entry
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def clear(self) -> None:
+    """
+    Empties the cache
+    """
+    with self._lock:
+      self._entries.clear()
+
+
+fragment_cache = FragmentCache()
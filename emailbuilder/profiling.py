@@ -0,0 +1,228 @@
+from .assets import asset_cache
+from .fragments import fragment_cache
+from .utils import parse_style, parse_properties, TagStripper
+
+from typing import Any, Callable, Optional
+
+import functools
+import sys
+import threading
+import time
+
+_active = None
+_inherited = object()
+
+
+class Stat:
+  """
+  Timings recorded for a single phase of a component or function
+
+  :param calls: Number of calls
+  :param seconds: Cumulative time spent, including nested calls
+  :param bytes: Number of characters or bytes emitted
+  :param cache_hits: Number of calls answered from a cache
+  """
+
+  def __init__(self) -> None:
+    self.calls = 0
+    self.seconds = 0.0
+    self.bytes = 0
+    self.cache_hits = 0
+
+  def as_dict(self) -> dict:
+    return {
+        "calls": self.calls,
+        "seconds": self.seconds,
+        "bytes": self.bytes,
+        "cache_hits": self.cache_hits
+    }
+
+
+class Profile:
+  """
+  Records per component class and per phase timings while active
+
+  Instrumentation is only installed while the profile is active,
+  so rendering has no profiling overhead otherwise
+
+  ```python
+  with eb.Profile() as profile:
+    email.message()
+  print(profile.summary())
+  ```
+  """
+
+  def __init__(self) -> None:
+    self.stats = {}
+    self.caches = {}
+    self._lock = threading.Lock()
+    self._restore = []
+    self._counters = {}
+
+  def stat(self, owner: str, phase: str) -> Stat:
+    """
+    Gets the timings recorded for a phase
+
+    :param owner: The component class or module
+    :param phase: The method or function
+
+    :return: The recorded timings
+    """
+    key = (owner, phase)
+    with self._lock:
+      if key not in self.stats:
+        self.stats[key] = Stat()
+      return self.stats[key]
+
+  def _record(self, owner: str, phase: str, seconds: float, size: int = 0, hit: bool = False) -> None:
+    stat = self.stat(owner, phase)
+    with self._lock:
+      stat.calls += 1
+      stat.seconds += seconds
+      stat.bytes += size
+      stat.cache_hits += hit
+
+  def _patch(self, target: Any, name: str, wrapper: Callable) -> None:
+    original = target.__dict__[name]
+    self._restore.append((target, name, original))
+    setattr(target, name, wrapper(original))
+
+  def _patch_global(self, name: str, wrapper: Callable) -> None:
+    originals = {}
+    for module_name, module in list(sys.modules.items()):
+      if module_name.split(".")[0] != "emailbuilder" or name not in vars(module):
+        continue
+      original = vars(module)[name]
+      if id(original) not in originals:
+        originals[id(original)] = wrapper(original)
+      self._restore.append((module, name, original))
+      setattr(module, name, originals[id(original)])
+
+  def _timed(self, owner: str, phase: str) -> Callable:
+    def wrapper(function: Callable) -> Callable:
+      @functools.wraps(function)
+      def timed(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        size = len(result) if isinstance(result, (str, bytes)) else 0
+        self._record(owner, phase, time.perf_counter() - start, size)
+        return result
+      return timed
+    return wrapper
+
+  def _timed_method(self, phase: str) -> Callable:
+    def wrapper(function: Callable) -> Callable:
+      @functools.wraps(function)
+      def timed(instance, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(instance, *args, **kwargs)
+        size = len(result) if isinstance(result, (str, bytes)) else 0
+        self._record(type(instance).__name__, phase, time.perf_counter() - start, size)
+        return result
+      return timed
+    return wrapper
+
+  def _timed_attach(self, function: Callable) -> Callable:
+    @functools.wraps(function)
+    def timed(attachments, item, *args, **kwargs):
+      start = time.perf_counter()
+      result = function(attachments, item, *args, **kwargs)
+      # File attachments are only memory-mapped, so they are measured through the map
+      size = len(item) if item is not None else len(result["content"])
+      self._record("Attachments", "attach", time.perf_counter() - start, size)
+      return result
+    return timed
+
+  def _cache_counters(self) -> dict:
+    style = parse_style.cache_info()
+    properties = parse_properties.cache_info()
+    return {
+        "style": (style.hits, style.misses),
+        "properties": (properties.hits, properties.misses),
+        "assets": (asset_cache.hits, asset_cache.misses),
+        "fragments": (fragment_cache.hits, fragment_cache.misses)
+    }
+
+  def __enter__(self) -> "Profile":
+    global _active
+    if _active is not None:
+      raise RuntimeError("A profile is already active")
+    _active = self
+
+    from .components import base, Component, Container
+    from .context import Attachments
+    from .email import EMail
+
+    self._patch(base, "_tracer", lambda tracer: self._record)
+    self._patch(Component, "apply_style", self._timed_method("apply_style"))
+    self._patch(Container, "inherited_style", self._timed_method("inherited_style"))
+    self._patch(Attachments, "attach", self._timed_attach)
+    for klass in [EMail, *_subclasses(EMail)]:
+      for phase in ("html", "plain", "render", "message", "mime"):
+        if phase in klass.__dict__:
+          self._patch(klass, phase, self._timed_method(phase))
+    for function in ("parse_text", "parse_style", "parse_properties", "fig_bytes"):
+      self._patch_global(function, self._timed("utils", function))
+    self._patch_global("MIMEImage", self._timed("email.mime", "MIMEImage"))
+    TagStripper.feed = self._timed("TagStripper", "feed")(TagStripper.feed)
+    self._restore.append((TagStripper, "feed", _inherited))
+
+    self._counters = self._cache_counters()
+    return self
+
+  def __exit__(self, *exc: Any) -> None:
+    global _active
+    after = self._cache_counters()
+    for name, (hits, misses) in after.items():
+      before = self._counters[name]
+      self.caches[name] = {"hits": hits - before[0], "misses": misses - before[1]}
+    for target, name, original in reversed(self._restore):
+      if original is _inherited:
+        delattr(target, name)
+      else:
+        setattr(target, name, original)
+    self._restore = []
+    _active = None
+
+  def report(self) -> dict:
+    """
+    Gets the recorded timings as a structured report
+
+    :return: The timings of each phase, slowest first, and the
+             hits and misses of each cache while the profile was active
+    """
+    phases = [
+        {"owner": owner, "phase": phase, **stat.as_dict()}
+        for (owner, phase), stat in self.stats.items()
+    ]
+    phases.sort(key=lambda phase: phase["seconds"], reverse=True)
+    return {"phases": phases, "caches": dict(self.caches)}
+
+  def summary(self, limit: Optional[int] = None) -> str:
+    """
+    Gets the recorded timings as a text table
+
+    :param limit: Maximum number of phases to list
+
+    :return: The text table
+    """
+    report = self.report()
+    lines = [f"{'owner':<16} {'phase':<18} {'calls':>8} {'seconds':>10} {'bytes':>12} {'hits':>8}"]
+    for phase in report["phases"][:limit]:
+      lines.append(
+          f"{phase['owner']:<16} {phase['phase']:<18} {phase['calls']:>8} "
+          f"{phase['seconds']:>10.4f} {phase['bytes']:>12} {phase['cache_hits']:>8}"
+      )
+    for name, counters in report["caches"].items():
+      lines.append(f"cache {name}: {counters['hits']} hits, {counters['misses']} misses")
+    return "\n".join(lines)
+
+
+def _subclasses(klass: type) -> list:
+  _classes = []
+  stack = list(klass.__subclasses__())
+  while stack:
+    subclass = stack.pop()
+    _classes.append(subclass)
+    stack.extend(subclass.__subclasses__())
+  return _classes
@@ -0,0 +1,256 @@
+"""
+Compact, versioned serialisation of e-mails and their component trees
+
+An e-mail is serialised as a JSON object:
+
+  {
+    "version": 1,
+    "email": {"class", "subject", "sender", "receiver", "copy",
+              "blind_copy", "style", "compact", "hoist_styles",
+              "items", "attachments"},
+    "types": [component class names],
+    "nodes": [nodes, depth-first],
+    "assets": {digest: base64 content}
+  }
+
+Each node is either a string, for text items, or a list of its type's
+index in "types", its public attributes, its number of children and
+whether it is a fragment. "items" is the number of top-level nodes.
+Attributes holding bytes, e.g. an ImageRaw's image, are stored as
+"$name": digest and their content is kept once in "assets", or in an
+external store. Figures are stored as the ImageRaw of their raster,
+tables' headers and cells as the text they are rendered as, and
+rendering caches aren't stored
+"""
+
+from .components import Component, Container, Figure, Table
+from .components.base import _link, _public_state, empty_properties, empty_style
+from .context import Attachment
+from .email import EMail
+from .experimental import EMail as ExperimentalEMail
+from .utils import digest
+
+from collections.abc import MutableMapping
+from typing import Iterable, Optional
+
+import base64
+import json
+
+version = 1
+
+_email_classes = {"EMail": EMail, "experimental.EMail": ExperimentalEMail}
+
+
+def _component_types() -> dict:
+  types = {}
+  stack = [Component]
+  while stack:
+    klass = stack.pop()
+    if klass.__module__.startswith("emailbuilder."):
+      types[klass.__qualname__] = klass
+    stack.extend(klass.__subclasses__())
+  return types
+
+
+def _asset(content: bytes, assets: dict, store: Optional[MutableMapping]) -> str:
+  _digest = digest(content)
+  if store is None:
+    if _digest not in assets:
+      assets[_digest] = base64.b64encode(content).decode("ascii")
+  elif _digest not in store:
+    store[_digest] = bytes(content)
+  return _digest
+
+
+def _node_state(node: Component) -> tuple:
+  if issubclass(type(node), Figure):
+    _image, _cid = node.rasterise()
+    return "ImageRaw", {
+        "alt": node.alt, "cid": _cid, "image": _image,
+        "properties": node.properties, "style": node.style, "type": "png"
+    }
+  state = dict(_public_state(node))
+  if issubclass(type(node), Table):
+    # Cells can hold any value, e.g. dates, and formatters can't be
+    # serialised, so the cells are stored as the text they render as
+    state["rows"] = list(node.iter_cells())
+    if node.header is not None:
+      state["header"] = [str(title) for title in node.header]
+    state["column_styles"] = list(state["column_styles"]) + [None] * (len(state["formatters"]) - len(state["column_styles"]))
+    state["formatters"] = []
+  return type(node).__qualname__, state
+
+
+def _check_nodes(types: list, nodes: list, error: TypeError) -> None:
+  """
+  Finds the attribute that can't be serialised, to name it in the error
+  """
+  for node in nodes:
+    if isinstance(node, str):
+      continue
+    for key, value in node[1].items():
+      try:
+        json.dumps(value)
+      except TypeError as _error:
+        raise TypeError(f"Can't serialise the {key} attribute of a {types[node[0]]}: {_error}") from error
+
+
+def dumps(email: EMail, store: Optional[MutableMapping] = None) -> str:
+  """
+  Serialises an e-mail and its component tree
+
+  :param email: The e-mail
+  :param store: Mapping the assets are stored in, by digest, instead
+                of inline, e.g. a dict shared with the workers or a cache
+
+  :return: The serialised e-mail, as JSON
+  """
+  assets = {}
+  types = []
+  type_index = {}
+  nodes = []
+
+  stack = list(reversed(email.items))
+  while stack:
+    node = stack.pop()
+    if not issubclass(type(node), Component):
+      nodes.append(str(node))
+      continue
+    name, state = _node_state(node)
+    attributes = {}
+    for key, value in state.items():
+      if key == "style" and value is empty_style or key == "properties" and value is empty_properties:
+        continue
+      if isinstance(value, (bytes, bytearray, memoryview)):
+        attributes["$" + key] = _asset(value, assets, store)
+      else:
+        attributes[key] = value
+    if name not in type_index:
+      type_index[name] = len(types)
+      types.append(name)
+    children = node.children if issubclass(type(node), Container) else ()
+    nodes.append([type_index[name], attributes, len(children), 1 if node._fragment else 0])
+    stack.extend(reversed(children))
+
+  attachments = []
+  for attachment in email._added.items:
+    _attachment = {
+        "cid": attachment["cid"],
+        "type": attachment["type"],
+        "extension": attachment["extension"],
+        "uuid": attachment["uuid"],
+        "src": attachment["src"]
+    }
+    if "content" in attachment:
+      _attachment["$content"] = _asset(attachment["content"], assets, store)
+    attachments.append(_attachment)
+
+  _class = "experimental.EMail" if isinstance(email, ExperimentalEMail) else "EMail"
+  document = {
+      "version": version,
+      "email": {
+          "class": _class,
+          "subject": email.subject,
+          "sender": email.sender,
+          "receiver": email.receiver,
+          "copy": email.copy,
+          "blind_copy": email.blind_copy,
+          "style": email.style,
+          "compact": email.compact,
+          "hoist_styles": email.hoist_styles,
+          "items": len(email.items),
+          "attachments": attachments
+      },
+      "types": types,
+      "nodes": nodes
+  }
+  if store is None:
+    document["assets"] = assets
+  try:
+    return json.dumps(document, separators=(",", ":"))
+  except TypeError as error:
+    _check_nodes(types, nodes, error)
+    raise
+
+
+def loads(data: str | bytes, store: Optional[MutableMapping] = None, types: Optional[Iterable[type]] = None) -> EMail:
+  """
+  Rebuilds an e-mail serialised with `dumps`
+
+  :param data: The serialised e-mail
+  :param store: Mapping the assets were stored in, if they aren't inline
+  :param types: Custom component classes used in the e-mail
+
+  :return: The e-mail
+  """
+  document = json.loads(data)
+  if document.get("version") != version:
+    raise ValueError(f"Unsupported serialisation version: {document.get('version')}")
+  assets = document.get("assets", {})
+
+  def asset(key: str) -> bytes:
+    if key in assets:
+      return base64.b64decode(assets[key])
+    if store is None:
+      raise KeyError(f"Missing asset: {key}")
+    return store[key]
+
+  known = _component_types()
+  for klass in types or ():
+    known[klass.__qualname__] = klass
+  classes = []
+  for name in document["types"]:
+    if name not in known:
+      raise ValueError(f"Unknown component type: {name}")
+    classes.append(known[name])
+
+  header = document["email"]
+  email = _email_classes[header["class"]].__new__(_email_classes[header["class"]])
+  EMail.__init__(
+      email,
+      header["subject"],
+      header["sender"],
+      header["receiver"],
+      header["copy"],
+      header["blind_copy"],
+      header["style"]
+  )
+  email.compact = header["compact"]
+  email.hoist_styles = header["hoist_styles"]
+
+  # Each entry is a parent's children list, its container and the number of children left
+  stack = [(email.items, None, header["items"])]
+  for entry in document["nodes"]:
+    children, parent, remaining = stack.pop()
+    if remaining > 1:
+      stack.append((children, parent, remaining - 1))
+    if isinstance(entry, str):
+      children.append(entry)
+      continue
+    index, attributes, count, fragment = entry
+    klass = classes[index]
+    node = klass.__new__(klass)
+    if issubclass(klass, Container):
+      Container.__init__(node, attributes.pop("style", None), attributes.pop("properties", None))
+    else:
+      Component.__init__(node, attributes.pop("style", None), attributes.pop("properties", None))
+    for key, value in attributes.items():
+      if key[0] == "$":
+        object.__setattr__(node, key[1:], asset(value))
+      else:
+        object.__setattr__(node, key, value)
+    node._fragment = bool(fragment)
+    if parent is not None:
+      _link(node, parent)
+    children.append(node)
+    if count:
+      stack.append((node.children, node, count))
+
+  email._added.replay([
+      Attachment(
+          {key: value for key, value in attachment.items() if key != "$content"},
+          **({"content": asset(attachment["$content"])} if "$content" in attachment else {})
+      )
+      for attachment in header["attachments"]
+  ])
+  return email
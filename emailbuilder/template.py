@@ -0,0 +1,142 @@
+from .context import AttachmentRegistry
+from .email import EMail, RenderedEMail, build_message
+
+from email.message import EmailMessage
+from html import escape
+from typing import Any, Callable, Optional
+
+import re
+
+slot_pattern = re.compile(r"\{\{|\}\}|\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class Segments:
+  """
+  Static text, split around its named slots
+
+  :param text: Text containing "{name}" slots, and literal braces
+               written as "{{" and "}}"
+  """
+
+  def __init__(self, text: str) -> None:
+    self.statics = []
+    self.slots = []
+    _static = []
+    _start = 0
+    for match in slot_pattern.finditer(text):
+      _static.append(text[_start:match.start()])
+      _start = match.end()
+      if match.group(1) is None:
+        _static.append(match.group()[0])
+        continue
+      self.statics.append("".join(_static))
+      self.slots.append(match.group(1))
+      _static = []
+    _static.append(text[_start:])
+    self.statics.append("".join(_static))
+
+  def render(self, context: dict, escape: Optional[Callable[[str], str]] = None) -> str:
+    """
+    Fills the slots in with the context's values
+
+    :param context: Values for each slot, by name
+    :param escape: Escapes the values, e.g. `html.escape`
+
+    :return: The filled-in text
+    """
+    if not self.slots:
+      return self.statics[0]
+    _parts = [self.statics[0]]
+    for slot, static in zip(self.slots, self.statics[1:]):
+      _value = str(context[slot])
+      _parts.append(_value if escape is None else escape(_value))
+      _parts.append(static)
+    return "".join(_parts)
+
+
+class Template:
+  """
+  A compiled e-mail, rendered once and then filled in per recipient
+
+  Slot values are HTML-escaped in the HTML body, and inserted verbatim
+  into the plain-text body and the e-mail's headers. Literal braces
+  are written "{{" and "}}"
+
+  :param email: The e-mail to compile
+  """
+
+  def __init__(self, email: EMail) -> None:
+    rendered = email.render()
+    self.subject = self._compile(email.subject)
+    self.sender = self._compile(email.sender)
+    self.receiver = self._compile(email.receiver)
+    self.copy = self._compile(email.copy)
+    self.blind_copy = self._compile(email.blind_copy)
+    self.html = Segments(rendered.html)
+    self.plain = Segments(rendered.plain)
+    self.attachments = rendered.attachments
+
+  @staticmethod
+  def _compile(value: Any) -> Any:
+    if isinstance(value, str):
+      return Segments(value)
+    if isinstance(value, list):
+      return [Template._compile(item) for item in value]
+    return value
+
+  @staticmethod
+  def _fill(value: Any, context: dict) -> Any:
+    if isinstance(value, Segments):
+      return value.render(context)
+    if isinstance(value, list):
+      return [Template._fill(item, context) for item in value]
+    return value
+
+  @property
+  def slots(self) -> set:
+    """
+    The names of every slot in the template
+    """
+    _slots = set(self.html.slots) | set(self.plain.slots)
+    for header in (self.subject, self.sender, self.receiver, self.copy, self.blind_copy):
+      for value in header if isinstance(header, list) else [header]:
+        if isinstance(value, Segments):
+          _slots.update(value.slots)
+    return _slots
+
+  def render(self, context: Optional[dict] = None) -> RenderedEMail:
+    """
+    Render the e-mail for a recipient
+
+    :param context: Values for each slot, by name
+
+    :return: The rendered e-mail
+    """
+    if context is None:
+      context = {}
+    return RenderedEMail(
+        self.html.render(context, escape),
+        self.plain.render(context),
+        list(self.attachments)
+    )
+
+  def message(self, context: Optional[dict] = None, registry: Optional[AttachmentRegistry] = None) -> EmailMessage:
+    """
+    Get the e-mail for a recipient as an EmailMessage object
+
+    :param context: Values for each slot, by name
+    :param registry: Shares encoded attachments with other messages
+
+    :return: The e-mail as an EmailMessage object
+    """
+    if context is None:
+      context = {}
+    return build_message(
+        self.render(context),
+        self._fill(self.subject, context),
+        self._fill(self.sender, context),
+        self._fill(self.receiver, context),
+        self._fill(self.copy, context),
+        self._fill(self.blind_copy, context),
+        registry
+    )
@@ -1,43 +1,288 @@
 import re
 import io
+import hashlib
+from collections import ChainMap
+from collections.abc import Mapping
+from functools import cached_property, lru_cache
 from html.parser import HTMLParser
+from typing import Any, Iterable
 
 const = {
     "tab_size": 2
 }
 
 
-def parse_style(style: dict) -> str:
-  parsed_style = ""
-  for attr, value in style.items():
-    parsed_style += f"{attr}: {value} !important; "
-  return parsed_style
+class StyleChain(ChainMap):
+  """
+  Read-only, layered view of the style rules a component inherits
 
-def parse_properties(properties: dict) -> str:
-  parsed_properties = ""
-  for attr, value in properties.items():
-    parsed_properties += f"{attr}=\"{value}\""
-  return parsed_properties
+  Inheriting a style only copies the references to its rule
+  categories, never the rules themselves, and keeps a single layer
+  so that lookups don't slow down in deeply nested components. The
+  global rules are the exception: containers write the attributes
+  they pass down into them
+  """
 
+  def __setitem__(self, key, value):
+    raise TypeError("StyleChain is read-only")
 
-def parse_text(text: str) -> str:
-  parsed_text = text
+  def __delitem__(self, key):
+    raise TypeError("StyleChain is read-only")
+
+  @property
+  def key(self) -> tuple:
+    """
+    Frozen copy of the style rules, used to compare inherited styles
+    """
+    rules = self.get("global")
+    return (self._key, tuple(rules.items()) if isinstance(rules, Mapping) else rules)
+
+  @cached_property
+  def _key(self) -> tuple:
+    return _freeze_rules({category: rules for category, rules in self.items() if category != "global"})
+
+
+class ReadOnlyDict(dict):
+  """
+  A dict that can't be changed, so that it can be shared, e.g. as the
+  style rules of every component created without custom ones
+  """
+
+  def _read_only(self, *args, **kwargs):
+    raise TypeError("ReadOnlyDict is read-only")
+
+  __setitem__ = __delitem__ = __ior__ = _read_only
+  clear = pop = popitem = setdefault = update = _read_only
+
+  def __copy__(self) -> "ReadOnlyDict":
+    return self
+
+  def __deepcopy__(self, memo: dict) -> "ReadOnlyDict":
+    return self
+
+  def __reduce__(self) -> tuple:
+    return ReadOnlyDict, (dict(self),)
+
+
+def freeze_style(style: Mapping) -> tuple:
+  """
+  Gets a frozen copy of style rules, which can be compared
+  with other style rules by value
+
+  :param style: Style rules, by category
+
+  :return: The frozen style rules
+  """
+  if isinstance(style, StyleChain):
+    return style.key
+  return _freeze_rules(style)
+
+
+def _freeze_rules(style: Mapping) -> tuple:
+  return tuple(
+      (category, tuple(rules.items()) if isinstance(rules, Mapping) else rules)
+      for category, rules in style.items()
+  )
+
+
+def inherit_style(style: Mapping, layer: dict) -> StyleChain:
+  """
+  Layers overriding rule categories on top of an inherited style
+
+  :param style: The inherited style rules
+  :param layer: The rule categories to override
+
+  :return: The combined style rules
+  """
+  return StyleChain({**style, **layer})
+
+
+@lru_cache(maxsize=1024)
+def _serialise_style(items: tuple) -> str:
+  return "".join([f"{attr}: {value} !important; " for attr, value in items])
+
+
+@lru_cache(maxsize=1024)
+def _serialise_properties(items: tuple) -> str:
+  return "".join([f"{attr}=\"{value}\"" for attr, value in items])
+
+
+def parse_style(style: Mapping) -> str:
+  """
+  Serialises style rules as an inline style attribute's value
+
+  Results are memoised by the rules' contents, see
+  `parse_style.cache_info()` for the cache's hits and misses
+  """
+  items = tuple(style.items())
+  try:
+    return _serialise_style(items)
+  except TypeError:
+    return _serialise_style.__wrapped__(items)
+
+
+def parse_properties(properties: Mapping) -> str:
+  """
+  Serialises properties as HTML attributes
 
-  bold = re.compile(r"\B(?<!\*)\*\*(?![\*\s])(.+?)(?<!\*\s)\*\*(?!\*)\B")
-  parsed_text = bold.sub(r"<b>\1</b>", parsed_text)
+  Results are memoised by the properties' contents, see
+  `parse_properties.cache_info()` for the cache's hits and misses
+  """
+  items = tuple(properties.items())
+  try:
+    return _serialise_properties(items)
+  except TypeError:
+    return _serialise_properties.__wrapped__(items)
 
-  oblique = re.compile(r"\B(?<!\*)\*(?![\*\s])(.+?)(?<!\*\s)\*(?!\*)\B")
-  parsed_text = oblique.sub(r"<i>\1</i>", parsed_text)
 
-  underlined = re.compile(r"\b(?<!\*)\_(?![\*\s])(.+?)(?<!\*\s)\_(?!\*)\b")
-  parsed_text = underlined.sub(r"<u>\1</u>", parsed_text)
+parse_style.cache_info = _serialise_style.cache_info
+parse_style.cache_clear = _serialise_style.cache_clear
+parse_properties.cache_info = _serialise_properties.cache_info
+parse_properties.cache_clear = _serialise_properties.cache_clear
 
-  strike = re.compile(r"\B(?<!\-)\-(?![\-\s])(.+?)(?<!\-\s)\-(?!\-)\B")
-  parsed_text = strike.sub(r"<s>\1</s>", parsed_text)
 
+_markup = [
+    ("**", re.compile(r"\B(?<!\*)\*\*(?![\*\s])(.+?)(?<!\*\s)\*\*(?!\*)\B"), r"<b>\1</b>"),
+    ("*", re.compile(r"\B(?<!\*)\*(?![\*\s])(.+?)(?<!\*\s)\*(?!\*)\B"), r"<i>\1</i>"),
+    ("_", re.compile(r"\b(?<!\*)\_(?![\*\s])(.+?)(?<!\*\s)\_(?!\*)\b"), r"<u>\1</u>"),
+    ("-", re.compile(r"\B(?<!\-)\-(?![\-\s])(.+?)(?<!\-\s)\-(?!\-)\B"), r"<s>\1</s>")
+]
+
+
+def _parse_text(text: str) -> str:
+  parsed_text = text
+  for marker, pattern, replacement in _markup:
+    if marker in parsed_text:
+      parsed_text = pattern.sub(replacement, parsed_text)
   return parsed_text
 
 
+@lru_cache(maxsize=4096)
+def parse_text(text: str) -> str:
+  """
+  Converts the text's `**bold**`, `*oblique*`, `_underlined_`
+  and `-struck-` markup to HTML
+
+  :param text: The text to convert
+
+  :return: The converted text
+  """
+  return _parse_text(text)
+
+
+def parse_text_many(texts: Iterable[str]) -> list:
+  """
+  Converts the markup of many texts to HTML, without
+  evicting other texts from `parse_text`'s cache
+
+  :param texts: The texts to convert
+
+  :return: The converted texts, in order
+  """
+  _parsed = {}
+  _texts = []
+  for text in texts:
+    if text not in _parsed:
+      _parsed[text] = _parse_text(text)
+    _texts.append(_parsed[text])
+  return _texts
+
+
+_tag_pattern = re.compile(r"<[A-Za-z][^<>]*>")
+_style_pattern = re.compile(r"\sstyle=\"([^\"]*)\"")
+_class_pattern = re.compile(r"\sclass=\"([^\"]*)\"")
+
+
+def extract_styles(html: str, min_count: int = 2, prefix: str = "eb-") -> str:
+  """
+  Moves the inline styles repeated across an HTML document's tags into
+  a `<style>` block, replacing them with generated class names. Styles
+  used only once, and the `<body>` tag's style, are kept inline
+
+  :param html: The HTML document
+  :param min_count: Minimum number of uses of a style to move it
+  :param prefix: Prefix of the generated class names
+
+  :return: The HTML document with a `<style>` block
+  """
+  counts = {}
+  for tag in _tag_pattern.findall(html):
+    if tag.startswith("<body"):
+      continue
+    match = _style_pattern.search(tag)
+    if match is not None and match.group(1).strip():
+      counts[match.group(1)] = counts.get(match.group(1), 0) + 1
+
+  classes = {}
+  for style, count in counts.items():
+    if count >= min_count:
+      classes[style] = f"{prefix}{len(classes)}"
+  if not classes:
+    return html
+
+  def replace(match: re.Match) -> str:
+    tag = match.group(0)
+    if tag.startswith("<body"):
+      return tag
+    style = _style_pattern.search(tag)
+    if style is None or style.group(1) not in classes:
+      return tag
+    name = classes[style.group(1)]
+    tag = tag[:style.start()] + tag[style.end():]
+    _class = _class_pattern.search(tag)
+    if _class is None:
+      return f"{tag[:style.start()]} class=\"{name}\"{tag[style.start():]}"
+    return f"{tag[:_class.end(1)]} {name}{tag[_class.end(1):]}"
+
+  html = _tag_pattern.sub(replace, html)
+  block = "<head><style type=\"text/css\">" + "".join([
+      f".{name} {{ {style.strip()} }}" for style, name in classes.items()
+  ]) + "</style></head>"
+  body = html.find("<body")
+  if body == -1:
+    return block + html
+  return html[:body] + block + html[body:]
+
+
+def digest(data: bytes | str) -> str:
+  """
+  Gets a stable content digest, used to address attachments
+
+  :param data: Content to digest
+
+  :return: The digest, as a hexadecimal string
+  """
+  if isinstance(data, str):
+    data = data.encode()
+  return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def freeze(value: Any) -> Any:
+  """
+  Gets a frozen copy of a component's attribute, which can be
+  compared with other attributes by value
+
+  :param value: The attribute's value
+
+  :return: The frozen value, or None if it can't be compared by value
+  """
+  if value is None or isinstance(value, (str, int, float, bool)):
+    return value
+  if isinstance(value, (bytes, bytearray, memoryview)):
+    return ("bytes", digest(bytes(value)))
+  if isinstance(value, Mapping):
+    items = tuple((key, freeze(item)) for key, item in value.items())
+    if any(item is None and value[key] is not None for key, item in items):
+      return None
+    return ("map", items)
+  if isinstance(value, (list, tuple)):
+    items = tuple(freeze(item) for item in value)
+    if any(frozen is None and item is not None for frozen, item in zip(items, value)):
+      return None
+    return ("seq", items)
+  return None
+
+
 def fig_bytes(fig, **kwargs):
   buf = io.BytesIO()
   fig.savefig(fname=buf, format='png', **kwargs)
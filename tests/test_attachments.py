@@ -0,0 +1,26 @@
+import emailbuilder as eb
+
+
+def test_added_attachment_keeps_its_content(tmp_path):
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  email.append(eb.Paragraph("Hello"))
+  email.attach(b"caller's bytes", "text", "plain", cid="note", src="note.txt")
+  email.message()
+  assert [a["content"] for a in email.attachments] == [b"caller's bytes"]
+
+  (tmp_path / "note.txt").write_bytes(b"file on disk")
+  email.attach(b"other bytes", "text", "plain", cid="other", src=str(tmp_path / "note.txt"))
+  email.message()
+  assert [a["content"] for a in email.attachments] == [b"caller's bytes", b"other bytes"]
+
+
+def test_image_attachment_is_revalidated(tmp_path):
+  path = tmp_path / "logo.png"
+  path.write_bytes(b"\x89PNG first")
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  email.append(eb.Image(str(path), cid="logo"))
+  email.html()
+  assert email.attachments[0]["content"] == b"\x89PNG first"
+  path.write_bytes(b"\x89PNG second, larger")
+  email.html()
+  assert [a["content"] for a in email.attachments] == [b"\x89PNG second, larger"]
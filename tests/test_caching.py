@@ -0,0 +1,70 @@
+import io
+
+import emailbuilder as eb
+
+
+def build(rows: int) -> tuple:
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  table = eb.Table.from_rows([[i, f"row {i}"] for i in range(rows)], header=["#", "Name"])
+  container = eb.Container()
+  container.append(eb.Paragraph("Before"))
+  container.append(table)
+  items = eb.OrderedList()
+  items.append(eb.Paragraph("first"))
+  items.append(eb.Table.from_rows([[1, 2]]))
+  email.append(container)
+  email.append(items)
+  email.cache = True
+  return email, container, table
+
+
+def test_streaming_keeps_no_output():
+  email, container, table = build(50)
+  fp = io.StringIO()
+  email.write_html(fp)
+  assert fp.getvalue() == email.html()
+  email, container, table = build(50)
+  email.write_html(io.StringIO())
+  assert container._html_cache is None and table._html_cache is None
+
+
+def test_large_tables_are_rendered_live(monkeypatch):
+  email, container, table = build(50)
+  expected = (email.html(), email.plain())
+  monkeypatch.setattr(eb.Table, "cache_rows", 10)
+  email, container, table = build(50)
+  assert (email.html(), email.plain()) == expected
+  assert (email.html(), email.plain()) == expected
+  assert table._html_cache is None and table._plain_cache is None
+  assert container._html_cache is not None and container._html_flat is None
+
+  table.rows = table.rows[:5]
+  assert "row 5<" not in email.html()
+  assert table._html_cache is not None
+
+
+def test_cache_is_opt_in():
+  email, container, table = build(5)
+  email.cache = False
+  html = email.html()
+  assert email.plain()
+  assert container._html_cache is None and container._plain_cache is None
+  email.cache = True
+  assert email.html() == html
+  assert container._html_cache is not None
+
+
+def test_in_place_changes_without_cache():
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  paragraph = eb.Paragraph("text", properties={"id": "a"})
+  table = eb.Table.from_rows([[1, 2]])
+  container = eb.Container()
+  container.append(paragraph)
+  email.append(container)
+  email.append(table)
+  email.html()
+  paragraph.properties["id"] = "b"
+  table.rows.append([3, 4])
+  container.children.append(eb.Paragraph("appended"))
+  html = email.html()
+  assert 'id="b"' in html and "<td>3</td>" in html and "appended" in html
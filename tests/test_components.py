@@ -0,0 +1,146 @@
+import re
+
+import emailbuilder as eb
+from emailbuilder.components.base import Component
+
+
+class Legacy(Component):
+  # Written against the original API, without calling Component.__init__
+  def __init__(self, text, style=None):
+    self.email = None
+    self.text = text
+    self.keys = ["global"]
+    if style is None:
+      style = {}
+    self.style = style
+
+  def html(self, style, context=None):
+    return f"<p>{self.text}</p>"
+
+  def plain(self, context=None):
+    return self.text + "\n"
+
+
+def test_component_without_base_init():
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  container = eb.Container()
+  item = Legacy("first")
+  container.append(item)
+  email.append(container)
+  assert "<p>first</p>" in email.html()
+  item.text = "second"
+  assert "<p>second</p>" in email.html()
+  assert "second" in email.plain()
+
+
+def test_parent_links_are_weak():
+  import gc
+  import pickle
+  item = eb.Paragraph("shared")
+  containers = [eb.Container() for _ in range(3)]
+  for container in containers:
+    container.append(item)
+    container.append(item)
+    container.html({})
+  del containers[1:], container
+  gc.collect()
+  assert len(list(eb.components.base._iter_parents(item))) == 1
+
+  containers[0].remove(item)
+  assert "shared" in containers[0].html({})
+  containers[0].remove(item)
+  assert list(eb.components.base._iter_parents(item)) == []
+
+  container = pickle.loads(pickle.dumps(containers[0]))
+  child = eb.Paragraph("child")
+  container.append(child)
+  container.html({})
+  copy = pickle.loads(pickle.dumps(container))
+  copy.children[0].content = "changed"
+  assert "changed" in copy.html({})
+
+
+class Original(Component):
+  # The original rendering signatures, without the render's context
+  def __init__(self, text):
+    super().__init__()
+    self.text = text
+
+  def html(self, style):
+    return f"<p>{self.text}</p>"
+
+  def plain(self):
+    return self.text + "\n"
+
+
+def test_original_rendering_signatures():
+  from emailbuilder.serialisation import dumps, loads
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  container = eb.Container()
+  container.append(Original("nested"))
+  email.append(Original("top"))
+  email.append(container)
+  assert "<p>top</p>" in email.html() and "<p>nested</p>" in email.html()
+  assert "top" in email.plain() and "nested" in email.plain()
+  copy = loads(dumps(email), types=[Original])
+  assert copy.html() == email.html() and copy.plain() == email.plain()
+
+
+class Box(eb.Container):
+  def html(self, style, context=None):
+    return "<section>" + self.render_children(style, context) + "</section>"
+
+
+class Wrapped(eb.Container):
+  def html(self, style, context=None):
+    return "<article>" + super().html(style, context) + "</article>"
+
+
+class Quoted(eb.Container):
+  # The original render_child signature
+  def render_child(self, child, style):
+    return f"<blockquote>{child.html(style) if isinstance(child, Component) else child}</blockquote>"
+
+
+class Listed(eb.Container):
+  def render_children(self, style, context=None):
+    return "<ul>" + super().render_children(style, context) + "</ul>"
+
+
+def test_container_overrides():
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  containers = [Box(), Wrapped(), Quoted(), Listed()]
+  paragraphs = []
+  for container in containers:
+    paragraph = eb.Paragraph("before")
+    paragraphs.append(paragraph)
+    container.append(paragraph)
+    email.append(container)
+  html = email.html()
+  assert html.count("<section>") == 1 and html.count("<article>") == 1
+  assert html.count("<blockquote>") == 1 and html.count("<ul>") == 1
+  assert containers[0].html({}).startswith("<section>")
+  for paragraph in paragraphs:
+    paragraph.content = "after"
+  html = email.html()
+  assert "before" not in html and html.count("after") == 4
+  assert html.count("<section>") == 1 and html.count("<blockquote>") == 1
+
+
+def test_passed_attributes_cascade():
+  # As in the original renderer, a container's passable attributes
+  # apply to the components after it within the same top-level item
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  outer = eb.Container()
+  inner = eb.Container(style={"color": "blue"})
+  inner.append(eb.Paragraph("inner"))
+  outer.append(inner)
+  outer.append(eb.Paragraph("after"))
+  email.append(outer)
+  email.append(eb.Paragraph("next"))
+
+  for cache in (False, True, True):
+    email.cache = cache
+    html = email.html()
+    colors = [re.search(f"<p style=\"color: ([^ ]+) [^>]*>{text}</p>", html).group(1) for text in ("inner", "after", "next")]
+    assert colors == ["blue", "blue", "#000000"]
@@ -0,0 +1,141 @@
+import asyncio
+import smtplib
+import threading
+
+import pytest
+
+import emailbuilder as eb
+from emailbuilder.delivery import SMTPConnection
+
+
+class FakeSMTP(smtplib.SMTP):
+  """
+  An SMTP connection that records the messages instead of sending them
+  """
+
+  def __init__(self, server: "FakeServer") -> None:
+    super().__init__()
+    self.server = server
+    self.open = True
+
+  def ehlo_or_helo_if_needed(self) -> None:
+    pass
+
+  def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()) -> dict:
+    self.server.gate.wait()
+    if self.server.failures:
+      error = self.server.failures.pop(0)
+      if error is not None:
+        raise error
+    self.server.sent.append((self, from_addr, list(to_addrs), msg))
+    return {}
+
+  def quit(self) -> tuple:
+    self.open = False
+    return 221, b"Bye"
+
+  def close(self) -> None:
+    self.open = False
+
+
+class FakeServer:
+  def __init__(self, failures=None) -> None:
+    self.failures = list(failures or [])
+    self.sent = []
+    self.connections = []
+    self.gate = threading.Event()
+    self.gate.set()
+
+  def connect(self) -> FakeSMTP:
+    smtp = FakeSMTP(self)
+    self.connections.append(smtp)
+    return smtp
+
+
+def make_email(copy=None) -> eb.EMail:
+  email = eb.EMail("Subject", "from@example.com", "to@example.com", copy=copy)
+  email.append(eb.Paragraph("Hello"))
+  return email
+
+
+def test_missing_copy_headers():
+  message = make_email().message()
+  assert message["CC"] is None and message["BCC"] is None
+  server = FakeServer()
+  with eb.SMTPPool(factory=server.connect, size=1) as pool:
+    pool.send(make_email())
+    pool.send(make_email().message().as_bytes())
+    pool.send(make_email("cc@example.com"))
+  assert [recipients for _, _, recipients, _ in server.sent] == [
+      ["to@example.com"], ["to@example.com"], ["to@example.com", "cc@example.com"]
+  ]
+
+
+def test_connection_reuse():
+  server = FakeServer()
+  connection = SMTPConnection(server.connect, max_messages=2)
+  for _ in range(5):
+    connection.send(make_email().message())
+  assert connection.connects == 3
+  assert [len([m for m in server.sent if m[0] is smtp]) for smtp in server.connections] == [2, 2, 1]
+  assert [smtp.open for smtp in server.connections] == [False, False, True]
+  connection.close()
+  assert not server.connections[-1].open
+
+
+def test_retry_after_disconnect():
+  server = FakeServer([smtplib.SMTPServerDisconnected("gone")])
+  connection = SMTPConnection(server.connect, retries=1)
+  connection.send(make_email().message())
+  assert connection.connects == 2 and len(server.sent) == 1
+  assert server.sent[0][0] is server.connections[1]
+
+  server = FakeServer([smtplib.SMTPServerDisconnected("gone")] * 2)
+  with pytest.raises(smtplib.SMTPServerDisconnected):
+    SMTPConnection(server.connect, retries=1).send(make_email().message())
+  assert server.sent == []
+
+
+def test_server_errors_are_not_retried():
+  server = FakeServer([smtplib.SMTPDataError(554, b"rejected")])
+  connection = SMTPConnection(server.connect, retries=3)
+  with pytest.raises(smtplib.SMTPDataError):
+    connection.send(make_email().message())
+  assert connection.connects == 1
+
+
+def test_submit_blocks_while_the_queue_is_full():
+  server = FakeServer()
+  server.gate.clear()
+  pool = eb.SMTPPool(factory=server.connect, size=1, queue_size=1)
+  futures = [pool.submit(make_email()), pool.submit(make_email())]
+  submitted = threading.Event()
+
+  def submit() -> None:
+    futures.append(pool.submit(make_email()))
+    submitted.set()
+
+  thread = threading.Thread(target=submit)
+  thread.start()
+  assert not submitted.wait(0.3)
+  server.gate.set()
+  thread.join(5)
+  assert submitted.is_set()
+  pool.close()
+  assert [future.result() for future in futures] == [{}, {}, {}]
+  assert len(server.sent) == 3
+  with pytest.raises(RuntimeError):
+    pool.submit(make_email())
+
+
+def test_async_pool():
+  server = FakeServer([None, smtplib.SMTPServerDisconnected("gone")])
+
+  async def run() -> list:
+    async with eb.AsyncSMTPPool(factory=server.connect, size=2, max_messages=2) as pool:
+      futures = [await pool.submit(make_email()) for _ in range(6)]
+      return await asyncio.gather(*futures)
+
+  assert asyncio.run(run()) == [{}] * 6
+  assert len(server.sent) == 6
+  assert not any(smtp.open for smtp in server.connections)
@@ -0,0 +1,53 @@
+import pytest
+
+import emailbuilder as eb
+
+
+def footer() -> eb.Container:
+  inner = eb.Container()
+  inner.append(eb.Paragraph("legal v1"))
+  outer = eb.Container()
+  outer.append(eb.Paragraph("Unsubscribe"))
+  outer.append(inner)
+  return outer.as_fragment()
+
+
+def email(item: eb.Container, cache: bool = False) -> eb.EMail:
+  _email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  _email.cache = cache
+  _email.append(eb.Paragraph("Hello"))
+  _email.append(item)
+  return _email
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_shared_fragment_is_invalidated_by_its_descendants(cache):
+  eb.fragment_cache.clear()
+  e1 = email(footer(), cache)
+  e1.html()
+  e1.plain()
+
+  f2 = footer()
+  e2 = email(f2, cache)
+  assert e2.html() == e1.html()
+  assert e2.plain() == e1.plain()
+
+  f2.children[1].children[0].content = "legal v2"
+  assert "legal v2" in e2.html()
+  assert "legal v1" not in e2.html()
+  assert "legal v2" in e2.plain()
+  assert "legal v1" in e1.html()
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_fragment_hit_survives_later_edits(cache):
+  eb.fragment_cache.clear()
+  email(footer(), cache).html()
+  f2 = footer()
+  e2 = email(f2, cache)
+  e2.html()
+  f2.children[0].content = "Manage preferences"
+  html = e2.html()
+  assert "Manage preferences" in html and "legal v1" in html
+  f2.children[1].children[0].content = "legal v3"
+  assert "legal v3" in e2.html()
@@ -0,0 +1,13 @@
+import emailbuilder as eb
+
+
+def test_profile_file_attachments(tmp_path):
+  path = tmp_path / "report.pdf"
+  path.write_bytes(b"%PDF" + b"0" * 96)
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  email.append(eb.Paragraph("Hello"))
+  with eb.Profile() as profile:
+    email.attach_file(str(path))
+    email.attach(b"inline", "text", "plain")
+    email.message()
+  assert profile.stat("Attachments", "attach").bytes == 106
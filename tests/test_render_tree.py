@@ -0,0 +1,148 @@
+import random
+import re
+
+import pytest
+
+import emailbuilder as eb
+from emailbuilder.components.base import Component, render_tree, _expands
+from emailbuilder.context import Attachments, RenderContext
+from emailbuilder.utils import inherit_style, parse_text, parse_text_many
+
+
+PNG = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde"
+    b"\x00\x00\x00\x0cIDATx\x9cc\xf8\xcf\xc0\x00\x00\x03\x01\x01\x00\xc9\xfe\x92\xef\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+
+class Big(eb.Table):
+  # Never cached, so its ancestors re-render it whenever they are reused
+  cache_rows = 1
+
+
+def reference_html(node, style, context):
+  # A plain recursive walk over the same rendering hooks
+  if not _expands(node, True):
+    return "".join(node.iter_html(style, context))
+  html = "".join(node.iter_html_open(style, context))
+  child_style = node.inherited_style(style)
+  for child in node.children:
+    before, after = node.html_child(child)
+    if isinstance(child, Component):
+      html += before + reference_html(child, child_style, context) + after
+    else:
+      html += before + str(child) + after
+  return html + "".join(node.iter_html_close(style, context))
+
+
+def reference_plain(node, context):
+  if not _expands(node, False):
+    return node.plain(context)
+  text = "".join(node.iter_plain_open(context))
+  for index, child in enumerate(node.children):
+    before, child_context, skip, after = node.plain_child(index, child, context)
+    if isinstance(child, Component):
+      text += before + reference_plain(child, child_context)[skip:] + after
+    else:
+      text += before + str(child) + after
+  return text + "".join(node.iter_plain_close(context))
+
+
+def item_style(email):
+  return inherit_style(email.style, {"global": dict(email.style["global"])})
+
+
+def random_node(r, depth):
+  kinds = ["p", "h", "s", "img", "custom", "c", "ol", "ul", "t", "rows", "big"] if depth < 5 else ["p", "h", "s"]
+  kind = r.choice(kinds)
+  if kind == "p":
+    return eb.Paragraph(r.choice(["a", "**b**", "x *y* _z_"]), style=r.choice([{}, {"color": "red"}]))
+  if kind == "h":
+    return eb.Header(r.choice(["h", "-h-"]), style=r.choice([{}, {"font-size": "9px"}]))
+  if kind == "s":
+    return r.choice(["", "t", "-s-"])
+  if kind == "img":
+    return eb.ImageRaw(PNG, "png", alt="i", cid=r.choice(["a", "b"]))
+  if kind == "custom":
+    return eb.Custom("<b>c</b>", r.choice(["", "pt"]))
+  if kind in ("rows", "big"):
+    cls = Big if kind == "big" else eb.Table
+    return cls.from_rows(
+        [[i, "x"] for i in range(r.randint(0, 3))],
+        header=r.choice([None, ["a", "b"]]),
+        style=r.choice([{}, {"color": "teal"}])
+    )
+  cls = {"c": eb.Container, "ol": eb.OrderedList, "ul": eb.UnorderedList, "t": eb.Table}[kind]
+  container = cls(style=r.choice([{}, {"color": "blue", "margin": "1px"}, {"font-size": "3px"}]))
+  for _ in range(r.randint(0, 4)):
+    container.append(random_node(r, depth + 1))
+  return container
+
+
+def random_change(r, email):
+  components = [item for item in email.walk() if isinstance(item, Component)]
+  if not components:
+    return
+  item = r.choice(components)
+  if isinstance(item, eb.Table) and item.header is not None and r.random() < 0.5:
+    item.rows.append([len(item.rows), "y"])
+    item.mark_dirty()
+  elif isinstance(item, eb.Container) and item.children and r.random() < 0.5:
+    if r.random() < 0.5:
+      item.remove(r.choice(item.children))
+    else:
+      item.children[0] = "changed"
+      item.mark_dirty()
+  elif isinstance(item, eb.Container):
+    item.append(random_node(r, 4))
+  elif isinstance(item, (eb.Paragraph, eb.Header)) and r.random() < 0.5:
+    item.content = r.choice(["new", "*new*"])
+  else:
+    item.style = r.choice([{}, {"color": "green"}, {"font-weight": "bold"}])
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_render_tree_matches_reference(cache):
+  for seed in range(150):
+    r = random.Random(seed)
+    email = eb.EMail("Subject", "from@example.com", "to@example.com",
+                     style=r.choice([{}, {"container": {"padding": "2px", "color": "olive"}}]))
+    for _ in range(r.randint(1, 5)):
+      email.append(random_node(r, 0))
+    email.cache = cache
+
+    for _ in range(4):
+      compact = r.random() < 0.5
+      attachments = Attachments()
+      context = RenderContext(attachments, compact=compact, cache=cache)
+      expected_attachments = Attachments()
+      expected_context = RenderContext(expected_attachments, compact=compact)
+      plain = []
+      for item in email.items:
+        if not isinstance(item, Component):
+          plain.append(f"{item}\n")
+          continue
+        html = "".join(render_tree(item, True, item_style(email), context))
+        assert html == reference_html(item, item_style(email), expected_context), seed
+        plain.append(reference_plain(item, RenderContext()))
+      assert [a["cid"] for a in attachments.items] == [a["cid"] for a in expected_attachments.items]
+      assert email.plain() == "".join(plain), seed
+      random_change(r, email)
+
+
+def reference_parse_text(text):
+  # The original sequential substitutions
+  text = re.sub(r"\B(?<!\*)\*\*(?![\*\s])(.+?)(?<!\*\s)\*\*(?!\*)\B", r"<b>\1</b>", text)
+  text = re.sub(r"\B(?<!\*)\*(?![\*\s])(.+?)(?<!\*\s)\*(?!\*)\B", r"<i>\1</i>", text)
+  text = re.sub(r"\b(?<!\*)\_(?![\*\s])(.+?)(?<!\*\s)\_(?!\*)\b", r"<u>\1</u>", text)
+  text = re.sub(r"\B(?<!\-)\-(?![\-\s])(.+?)(?<!\-\s)\-(?!\-)\B", r"<s>\1</s>", text)
+  return text
+
+
+def test_parse_text_matches_reference():
+  r = random.Random(16)
+  alphabet = "**__--  ab.\n"
+  texts = ["".join(r.choices(alphabet, k=r.randint(0, 24))) for _ in range(200_000)]
+  expected = [reference_parse_text(text) for text in texts]
+  assert [parse_text(text) for text in texts] == expected
+  assert parse_text_many(texts) == expected
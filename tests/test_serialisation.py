@@ -0,0 +1,63 @@
+import datetime
+import decimal
+
+import pytest
+
+import emailbuilder as eb
+from emailbuilder.serialisation import dumps, loads
+
+
+class FakeFigure:
+  def savefig(self, fname, **kwargs):
+    fname.write(b"\x89PNG figure")
+
+
+def build(tmp_path) -> eb.EMail:
+  email = eb.EMail("Subject", "from@example.com", "to@example.com")
+  email.append(eb.Header("Report"))
+  email.append(eb.Table.from_rows(
+      [[datetime.date(2024, 1, 31), decimal.Decimal("12.50")], [datetime.date(2024, 2, 29), decimal.Decimal("7")]],
+      header=["Date", decimal.Decimal("1.0")]
+  ))
+  email.append(eb.Table.from_rows([[1, 2.5]], formatters=[None, "{:.2f}".format]))
+  email.append(eb.Figure(FakeFigure(), alt="Chart"))
+  email.attach(b"inline bytes", "text", "plain", cid="notes.txt")
+  path = tmp_path / "report.pdf"
+  path.write_bytes(b"%PDF report")
+  email.attach_file(str(path))
+  return email
+
+
+def test_round_trip(tmp_path):
+  email = build(tmp_path)
+  html, plain = email.html(), email.plain()
+  copy = loads(dumps(email))
+  assert copy.html() == html
+  assert copy.plain() == plain
+  assert [(a["cid"], bytes(a["content"])) for a in copy.attachments] == [
+      (a["cid"], bytes(a["content"])) for a in email.attachments
+  ]
+  assert loads(dumps(copy)).html() == html
+
+
+def test_round_trip_with_store(tmp_path):
+  email = build(tmp_path)
+  store = {}
+  data = dumps(email, store)
+  assert "assets" not in data
+  assert loads(data, store).html() == email.html()
+
+
+def test_unserialisable_attribute_is_named():
+  email = eb.EMail()
+  email.append(eb.Paragraph(datetime.date(2024, 1, 1)))
+  with pytest.raises(TypeError, match="content attribute of a Paragraph"):
+    dumps(email)
+
+
+def test_figure_default_alt_is_stable():
+  email = eb.EMail()
+  email.append(eb.Figure(FakeFigure()))
+  assert email.items[0].alt == ""
+  assert dumps(email) == dumps(loads(dumps(email)))
+  assert email.plain() == "\n"
@@ -0,0 +1,26 @@
+import emailbuilder as eb
+
+
+def compile_email() -> eb.template.Template:
+  email = eb.EMail("Hello {name}", "from@example.com", "{address}")
+  email.append(eb.Paragraph("Dear {name}, use {{code}} at checkout"))
+  return email.compile()
+
+
+def test_slot_values_are_escaped_in_html_only():
+  template = compile_email()
+  rendered = template.render({"name": "<b>Ann & co</b>"})
+  assert "&lt;b&gt;Ann &amp; co&lt;/b&gt;" in rendered.html
+  assert "<b>Ann" not in rendered.html
+  assert "<b>Ann & co</b>" in rendered.plain
+  message = template.message({"name": "A & B", "address": "ann@example.com"})
+  assert message["Subject"] == "Hello A & B"
+
+
+def test_literal_braces():
+  template = compile_email()
+  assert template.slots == {"name", "address"}
+  rendered = template.render({"name": "Ann"})
+  assert "use {code} at checkout" in rendered.html
+  assert "use {code} at checkout" in rendered.plain
+  assert eb.template.Segments("{{}} {{{x}}}").render({"x": 1}) == "{} {1}"